@@ -0,0 +1,42 @@
+"""Add time-range indexes
+
+Revision ID: 8f3c2a1d9b7e
+Revises: 46daf5cd490c
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3c2a1d9b7e'
+down_revision: Union[str, None] = '46daf5cd490c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Seek index for keyset pagination of one user's transactions by time
+    op.create_index(
+        'idx_transaction_user_created',
+        'transactions',
+        ['user_id', 'created_at', 'transaction_id'],
+        unique=False
+    )
+    # Rows arrive in created_at order, so BRIN block ranges stay tight and
+    # the index is a few pages instead of a full B-tree
+    op.create_index(
+        'idx_transaction_created_at_brin',
+        'transactions',
+        ['created_at'],
+        unique=False,
+        postgresql_using='brin'
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_transaction_created_at_brin', table_name='transactions')
+    op.drop_index('idx_transaction_user_created', table_name='transactions')
@@ -0,0 +1,41 @@
+"""Add transaction id claims
+
+Revision ID: a7c3e9d15f04
+Revises: f1a9d4b6c2e8
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9d15f04'
+down_revision: Union[str, None] = 'f1a9d4b6c2e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('transaction_ids',
+    sa.Column('transaction_id', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('transaction_id')
+    )
+    # Claim the ids already in this database, live and archived
+    op.execute(
+        "INSERT INTO transaction_ids (transaction_id, user_id) "
+        "SELECT transaction_id, user_id FROM transactions"
+    )
+    op.execute(
+        "INSERT INTO transaction_ids (transaction_id, user_id) "
+        "SELECT a.transaction_id, t.user_id FROM archived_transactions a "
+        "JOIN archived_trees t ON t.root_id = a.root_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('transaction_ids')
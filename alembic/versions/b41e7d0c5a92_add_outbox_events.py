@@ -0,0 +1,39 @@
+"""Add outbox events
+
+Revision ID: b41e7d0c5a92
+Revises: 8f3c2a1d9b7e
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e7d0c5a92'
+down_revision: Union[str, None] = '8f3c2a1d9b7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox_events',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('event_type', sa.String(), nullable=False),
+    sa.Column('transaction_id', sa.BigInteger(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_outbox_user_id_id', 'outbox_events', ['user_id', 'id'], unique=False)
+    op.create_index('idx_outbox_created_at', 'outbox_events', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_outbox_created_at', table_name='outbox_events')
+    op.drop_index('idx_outbox_user_id_id', table_name='outbox_events')
+    op.drop_table('outbox_events')
@@ -0,0 +1,44 @@
+"""Add archived transaction type
+
+Revision ID: b8d4f2a6e913
+Revises: c5e1b7a94d36
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+import json
+import zlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d4f2a6e913'
+down_revision: Union[str, None] = 'c5e1b7a94d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('archived_transactions', sa.Column('type', sa.String(), nullable=True))
+    # Backfill from the packed trees, once, so reads never need to unpack them
+    connection = op.get_bind()
+    archived = sa.table('archived_transactions', sa.column('transaction_id'), sa.column('type'))
+    for root_id, payload in connection.execute(sa.text("SELECT root_id, payload FROM archived_trees")):
+        columns = json.loads(zlib.decompress(payload))
+        connection.execute(
+            archived.update().where(archived.c.transaction_id == sa.bindparam('id')).values(type=sa.bindparam('kind')),
+            [
+                {'id': transaction_id, 'kind': columns['types'][code]}
+                for transaction_id, code in zip(columns['transaction_id'], columns['type'])
+            ]
+        )
+    with op.batch_alter_table('archived_transactions') as batch_op:
+        batch_op.alter_column('type', existing_type=sa.String(), nullable=False)
+    op.create_index('idx_archived_transaction_type', 'archived_transactions', ['type', 'root_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_archived_transaction_type', table_name='archived_transactions')
+    op.drop_column('archived_transactions', 'type')
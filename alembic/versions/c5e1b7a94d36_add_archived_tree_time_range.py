@@ -0,0 +1,28 @@
+"""Add archived tree time range
+
+Revision ID: c5e1b7a94d36
+Revises: a7c3e9d15f04
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e1b7a94d36'
+down_revision: Union[str, None] = 'a7c3e9d15f04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('archived_trees', sa.Column('first_created_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('archived_trees', sa.Column('last_created_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('archived_trees', 'last_created_at')
+    op.drop_column('archived_trees', 'first_created_at')
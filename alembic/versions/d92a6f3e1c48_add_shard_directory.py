@@ -0,0 +1,31 @@
+"""Add shard directory
+
+Revision ID: d92a6f3e1c48
+Revises: b41e7d0c5a92
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd92a6f3e1c48'
+down_revision: Union[str, None] = 'b41e7d0c5a92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('shard_directory',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('shard_directory')
@@ -0,0 +1,48 @@
+"""Add transaction archive
+
+Revision ID: f1a9d4b6c2e8
+Revises: e5b8c1f7a3d2
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a9d4b6c2e8'
+down_revision: Union[str, None] = 'e5b8c1f7a3d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('archived_trees',
+    sa.Column('root_id', sa.BigInteger(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('subtree_sum', sa.Float(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('type_breakdown', sa.JSON(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['root_id'], ['transactions.transaction_id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('root_id')
+    )
+    op.create_index('idx_archived_tree_user_id', 'archived_trees', ['user_id'], unique=False)
+    op.create_table('archived_transactions',
+    sa.Column('transaction_id', sa.BigInteger(), nullable=False),
+    sa.Column('root_id', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['root_id'], ['archived_trees.root_id'], ),
+    sa.PrimaryKeyConstraint('transaction_id')
+    )
+    op.create_index('idx_archived_transaction_root_id', 'archived_transactions', ['root_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_archived_transaction_root_id', table_name='archived_transactions')
+    op.drop_table('archived_transactions')
+    op.drop_index('idx_archived_tree_user_id', table_name='archived_trees')
+    op.drop_table('archived_trees')
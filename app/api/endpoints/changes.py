@@ -0,0 +1,47 @@
+# app/api/endpoints/changes.py
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.core.auth import get_current_active_user
+from app.core.outbox import change_feeds, parse_offset, stream_changes
+from app.core.sharding import ShardUnavailable, shard_router, shard_unavailable
+from app.database import get_db
+
+router = APIRouter()
+
+@router.get("/changes")
+async def get_changes(
+  after: str = "0",
+  last_event_id: Annotated[Optional[str], Header()] = None,
+  db: Session = Depends(get_db),
+  current_user: int = Depends(get_current_active_user)
+):
+  """
+  Server-Sent Events feed of the user's transaction changes.
+  Resume from an offset with `?after=` or the standard Last-Event-ID header
+  (which takes precedence, so EventSource reconnects pick up where they left).
+  Offsets are "<shard>:<outbox id>"; one from a shard the user has since
+  moved off gets a reset event, as the ids are not comparable.
+  """
+  try:
+      from_shard, offset = parse_offset(last_event_id if last_event_id is not None else after)
+  except ValueError:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid offset")
+  try:
+      shard = shard_router.shard_for(current_user.id, db)
+  except ShardUnavailable:
+      raise shard_unavailable()
+  finally:
+      # get_db is torn down only after the response is sent, which for a
+      # stream is when the client leaves. The auth dependency shares this
+      # cached session, so closing it returns the request's only connection.
+      db.close()
+  return StreamingResponse(
+      stream_changes(
+          change_feeds[shard], current_user.id, offset,
+          reset="shard_moved" if from_shard not in (None, shard) else None
+      ),
+      media_type="text/event-stream",
+      headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+  )
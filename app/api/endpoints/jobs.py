@@ -0,0 +1,64 @@
+# app/api/endpoints/jobs.py
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from app.core.admission import admit
+from app.core.auth import get_current_active_user
+from app.core.jobs import cancel_job, submit_job
+from app.database import get_db
+from app.models.transaction import Job
+from app.schemas.job import JobCreate, JobList, JobResponse
+
+router = APIRouter()
+
+def get_user_job(db: Session, job_id: int, user_id: int) -> Job:
+  job = db.query(Job).filter(Job.id == job_id, Job.user_id == user_id).first()
+  if not job:
+      raise HTTPException(
+          status_code=status.HTTP_404_NOT_FOUND,
+          detail="Job not found"
+      )
+  return job
+
+@router.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(admit("write"))])
+async def create_job(
+  job: JobCreate,
+  db: Session = Depends(get_db),
+  current_user: int = Depends(get_current_active_user)
+):
+  """Queue a background job over the user's transactions; workers pick it up"""
+  try:
+      return submit_job(db, current_user.id, job.kind, job.params, public=True)
+  except ValueError as e:
+      raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+@router.get("/jobs", response_model=JobList, dependencies=[Depends(admit("point"))])
+async def list_jobs(
+  limit: int = Query(20, ge=1, le=100),
+  db: Session = Depends(get_db),
+  current_user: int = Depends(get_current_active_user)
+):
+  """The user's most recent jobs, newest first"""
+  jobs = db.query(Job).filter(Job.user_id == current_user.id).order_by(Job.id.desc()).limit(limit).all()
+  return JobList(items=[JobResponse.model_validate(job) for job in jobs])
+
+@router.get("/jobs/{job_id}", response_model=JobResponse, dependencies=[Depends(admit("point"))])
+async def get_job(
+  job_id: int,
+  db: Session = Depends(get_db),
+  current_user: int = Depends(get_current_active_user)
+):
+  """Status and progress (`progress` of `total` rows) of one job"""
+  return get_user_job(db, job_id, current_user.id)
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobResponse, dependencies=[Depends(admit("write"))])
+async def cancel_user_job(
+  job_id: int,
+  db: Session = Depends(get_db),
+  current_user: int = Depends(get_current_active_user)
+):
+  """Cancel a job; a running job stops after its current chunk ("cancelling")"""
+  job = get_user_job(db, job_id, current_user.id)
+  try:
+      return cancel_job(db, job)
+  except ValueError as e:
+      raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
@@ -0,0 +1,24 @@
+# app/api/endpoints/traces.py
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.core.auth import get_current_active_user
+from app.core.config import settings
+from app.core.tracing import trace_buffer
+
+router = APIRouter()
+
+@router.get("/traces")
+async def get_slowest_traces(
+  limit: int = Query(20, ge=1, le=200),
+  current_user: int = Depends(get_current_active_user)
+):
+  """
+  Slowest of the recently sampled request traces, with their nested spans.
+  Traces are not per user, so this is only served with TRACE_ENDPOINT_ENABLED.
+  """
+  if not settings.TRACE_ENDPOINT_ENABLED:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+  return {
+      "sample_rate": settings.TRACE_SAMPLE_RATE,
+      "buffered": len(trace_buffer.traces),
+      "traces": trace_buffer.slowest(limit),
+  }
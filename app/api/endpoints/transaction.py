@@ -1,22 +1,59 @@
 # app/api/endpoints/transaction.py
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from typing import List
-from fastapi_cache.decorator import cache
+import base64
+from typing import List, Optional
+from datetime import datetime, timezone
 from loguru import logger
-from app.database import get_db
-from app.models.transaction import Transaction
-from app.schemas.transaction import TransactionCreate, TransactionResponse, TransactionTypeResponse, SumResponse, StatusResponse
+from app.models.transaction import ArchivedTree, Transaction, OutboxEvent
+from app.schemas.transaction import TransactionCreate, TransactionResponse, TransactionTypeResponse, SumResponse, StatusResponse, TransactionPage
 from app.core.auth import get_current_active_user
-from sqlalchemy import text
+from app.core.admission import admit
+from app.core.archive import (
+  archived_ids_of_type, archived_page, archived_sum, archived_transaction, archived_version, is_archived, listing_key
+)
+from app.core.cache import cache
+from app.core.etag import conditional, make_etag
+from app.core.sharding import claim_transaction_id, get_shard_db, get_write_shard_db
+from app.core.tracing import span
+from app.database import get_db
+from sqlalchemy import text, tuple_
 
 router = APIRouter()
 
-@router.put("/transaction/{transaction_id}", response_model=StatusResponse)
+def transaction_etag(db: Session, current_user, transaction_id: int, **_) -> Optional[str]:
+  """Transactions are immutable once created, so created_at is their version"""
+  row = db.query(Transaction.created_at).filter(
+      Transaction.transaction_id == transaction_id,
+      Transaction.user_id == current_user.id
+  ).first()
+  if not row:
+      archived_at = archived_version(db, transaction_id, current_user.id)
+      return make_etag("t", transaction_id, archived_at) if archived_at else None
+  if row.created_at is None:
+      return None
+  return make_etag("t", transaction_id, row.created_at)
+
+def sum_etag(db: Session, current_user, transaction_id: int, **_) -> Optional[str]:
+  """A subtree's version is its root's last touch (see touch_ancestors)"""
+  row = db.query(Transaction.created_at, Transaction.updated_at).filter(
+      Transaction.transaction_id == transaction_id,
+      Transaction.user_id == current_user.id
+  ).first()
+  if not row:
+      archived_at = archived_version(db, transaction_id, current_user.id)
+      return make_etag("s", transaction_id, archived_at) if archived_at else None
+  version = row.updated_at or row.created_at
+  if version is None:
+      return None
+  return make_etag("s", transaction_id, version)
+
+@router.put("/transaction/{transaction_id}", response_model=StatusResponse, dependencies=[Depends(admit("write"))])
 async def create_transaction(
   transaction_id: int,
   transaction: TransactionCreate,
-  db: Session = Depends(get_db),
+  db: Session = Depends(get_write_shard_db),
+  primary: Session = Depends(get_db),
   current_user: int = Depends(get_current_active_user)
 ):
   try:
@@ -28,7 +65,12 @@ async def create_transaction(
         existing_transaction = db.query(Transaction).filter(
             Transaction.transaction_id == transaction_id
         ).first()
-        if existing_transaction:
+        # Ids are global: other shards' ids are only known to the primary
+        if (
+            existing_transaction
+            or is_archived(db, transaction_id)
+            or not claim_transaction_id(primary, transaction_id, current_user.id)
+        ):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Transaction with id {transaction_id} already exists"
@@ -40,6 +82,11 @@ async def create_transaction(
                 Transaction.transaction_id == transaction.parent_id,
                 Transaction.user_id == current_user.id
             ).first()
+            if is_archived(db, transaction.parent_id):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Parent transaction's tree is archived, restore it first"
+                )
             if not parent:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -52,6 +99,16 @@ async def create_transaction(
                 detail=f"Transaction {transaction_id} cannot reference itself as parent"
             )
 
+        if transaction.parent_id:
+            touch_ancestors(db, transaction.parent_id, current_user.id)
+            # touch_ancestors waited for any archiving holding the root's
+            # lock, so an archive committed since the check above is visible
+            if is_archived(db, transaction.parent_id):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Parent transaction's tree is archived, restore it first"
+                )
+
         db_transaction = Transaction(
             transaction_id=transaction_id,
             amount=transaction.amount,
@@ -63,30 +120,54 @@ async def create_transaction(
         # Log the transaction object
         logger.debug(f"Created transaction object: {db_transaction.__dict__}")
 
-        db.add(db_transaction)  
+        db.add(db_transaction)
+        # Published by the change feed relay once this commit is visible
+        db.add(OutboxEvent(
+            user_id=current_user.id,
+            event_type="transaction.created",
+            transaction_id=transaction_id,
+            payload={
+                "transaction_id": transaction_id,
+                "amount": transaction.amount,
+                "type": transaction.type,
+                "parent_id": transaction.parent_id,
+            }
+        ))
         db.commit()
+        if primary is not db:
+            # Also ends the directory lock taken by get_write_shard_db
+            primary.commit()
 
         logger.info(f"Transaction {transaction_id} created/updated by user {current_user.id}")
         return StatusResponse(status="ok")
+  except HTTPException:
+      db.rollback()
+      primary.rollback()
+      raise
   except Exception as e:
       logger.error(f"Error creating transaction: {str(e)}")
       db.rollback()
+      primary.rollback()
       raise HTTPException(
           status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
           detail="Error processing transaction"
       )
 
-@router.get("/transaction/{transaction_id}", response_model=TransactionResponse)
+@router.get("/transaction/{transaction_id}", response_model=TransactionResponse, dependencies=[Depends(admit("point"))])
+@conditional(transaction_etag)
 @cache(expire=300)  # Cache for 5 minutes
 async def get_transaction(
   transaction_id: int,
-  db: Session = Depends(get_db),
+  db: Session = Depends(get_shard_db),
   current_user: int = Depends(get_current_active_user)
 ):
   transaction = db.query(Transaction).filter(
       Transaction.transaction_id == transaction_id,
       Transaction.user_id == current_user.id
   ).first()
+  if not transaction:
+      # Descendants of settled trees live in the archive
+      transaction = archived_transaction(db, transaction_id, current_user.id)
 
   if not transaction:
       raise HTTPException(
@@ -96,11 +177,11 @@ async def get_transaction(
 
   return transaction
 
-@router.get("/types/{transaction_type}", response_model=List[int])
+@router.get("/types/{transaction_type}", response_model=List[int], dependencies=[Depends(admit("tree"))])
 @cache(expire=300)
 async def get_transactions_by_type(
   transaction_type: str,
-  db: Session = Depends(get_db),
+  db: Session = Depends(get_shard_db),
   current_user: int = Depends(get_current_active_user)
 ):
   """
@@ -113,8 +194,9 @@ async def get_transactions_by_type(
           Transaction.user_id == current_user.id
       ).all()
 
-      # Extract IDs from the query result
+      # Extract IDs from the query result, then the archived ones
       transaction_ids = [t.transaction_id for t in transactions]
+      transaction_ids += archived_ids_of_type(db, current_user.id, transaction_type)
 
       logger.info(f"Retrieved {len(transaction_ids)} transactions of type {transaction_type}")
       return transaction_ids
@@ -125,11 +207,68 @@ async def get_transactions_by_type(
           detail="Error retrieving transactions"
       )
 
-@router.get("/sum/{transaction_id}", response_model=SumResponse)
+# Pages are range scans of up to 1000 rows, so they queue behind point reads
+@router.get("/transactions", response_model=TransactionPage, dependencies=[Depends(admit("tree"))])
+async def list_transactions(
+  since: Optional[datetime] = None,
+  until: Optional[datetime] = None,
+  transaction_type: Optional[str] = Query(None, alias="type"),
+  parent_id: Optional[int] = None,
+  cursor: Optional[str] = None,
+  limit: int = Query(100, ge=1, le=1000),
+  db: Session = Depends(get_shard_db),
+  current_user: int = Depends(get_current_active_user)
+):
+  """
+  List transactions created in [since, until), oldest first.
+  Keyset pagination on (created_at, transaction_id): pass `next_cursor` back
+  as `cursor` to continue. Each page is an index seek on
+  idx_transaction_user_created, so deep pages cost the same as the first.
+  Archived descendants are merged in from the archived trees whose
+  created_at range overlaps the page.
+  """
+  query = db.query(Transaction).filter(Transaction.user_id == current_user.id)
+  if since is not None:
+      query = query.filter(Transaction.created_at >= since)
+  if until is not None:
+      query = query.filter(Transaction.created_at < until)
+  if transaction_type is not None:
+      query = query.filter(Transaction.type == transaction_type)
+  if parent_id is not None:
+      query = query.filter(Transaction.parent_id == parent_id)
+  after = None
+  if cursor is not None:
+      after = decode_cursor(cursor)
+      query = query.filter(
+          tuple_(Transaction.created_at, Transaction.transaction_id) > tuple_(*after)
+      )
+
+  # One extra row tells us whether another page exists
+  rows = [TransactionResponse.model_validate(row) for row in query.order_by(
+      Transaction.created_at, Transaction.transaction_id
+  ).limit(limit + 1).all()]
+
+  archived = archived_page(
+      db, current_user.id, limit + 1,
+      since=since, until=until, transaction_type=transaction_type, parent_id=parent_id,
+      after=after, upto=rows[-1].created_at if len(rows) > limit else None
+  )
+  if archived:
+      rows = sorted(
+          rows + [TransactionResponse.model_validate(row) for row in archived],
+          key=lambda row: listing_key(row.created_at, row.transaction_id)
+      )[:limit + 1]
+
+  items, more = rows[:limit], len(rows) > limit
+  next_cursor = encode_cursor(items[-1].created_at, items[-1].transaction_id) if more else None
+  return TransactionPage(items=items, next_cursor=next_cursor)
+
+@router.get("/sum/{transaction_id}", response_model=SumResponse, dependencies=[Depends(admit("tree"))])
+@conditional(sum_etag)
 @cache(expire=300)
 async def get_transaction_sum(
   transaction_id: int,
-  db: Session = Depends(get_db),
+  db: Session = Depends(get_shard_db),
   current_user: int = Depends(get_current_active_user)
 ):
   """
@@ -144,10 +283,19 @@ async def get_transaction_sum(
       ).first()
 
       if not transaction:
-          raise HTTPException(
-              status_code=status.HTTP_404_NOT_FOUND,
-              detail="Transaction not found"
-          )
+          # An archived descendant: sum its part of the archived tree
+          result = archived_sum(db, transaction_id, current_user.id)
+          if result is None:
+              raise HTTPException(
+                  status_code=status.HTTP_404_NOT_FOUND,
+                  detail="Transaction not found"
+              )
+          return SumResponse(sum=result)
+
+      # The root of an archived tree keeps its sum in the summary row
+      summary = db.get(ArchivedTree, transaction_id)
+      if summary is not None:
+          return SumResponse(sum=summary.subtree_sum)
 
       # Recursive CTE to get all child transactions
       recursive_query = text("""
@@ -165,14 +313,17 @@ async def get_transaction_sum(
           INNER JOIN transaction_tree tt ON t.parent_id = tt.transaction_id
           WHERE t.user_id = :user_id
       )
-      SELECT COALESCE(SUM(amount), 0) as total_sum
+      SELECT COALESCE(SUM(amount), 0) as total_sum, COUNT(*) as row_count
       FROM transaction_tree;
       """)
 
-      result = db.execute(
-          recursive_query,
-          {"transaction_id": transaction_id, "user_id": current_user.id}
-      ).scalar()
+      with span("db.subtree_sum") as subtree:
+          tree = db.execute(
+              recursive_query,
+              {"transaction_id": transaction_id, "user_id": current_user.id}
+          ).one()
+          subtree.set(rows=tree.row_count)
+      result = tree.total_sum
 
       if result is None:
           raise HTTPException(
@@ -191,12 +342,61 @@ async def get_transaction_sum(
 
 def check_circular_reference(db: Session, transaction_id: int, parent_id: int) -> bool:
   """Check if adding this parent would create a circular reference"""
-  current = parent_id
-  while current is not None:
-      if current == transaction_id:
-          return True
-      parent = db.query(Transaction).filter(
-          Transaction.transaction_id == current
-      ).first()
-      current = parent.parent_id if parent else None
-  return False
\ No newline at end of file
+  with span("db.parent_chain") as chain:
+      hops = 0
+      current = parent_id
+      while current is not None:
+          if current == transaction_id:
+              chain.set(hops=hops, circular=True)
+              return True
+          parent = db.query(Transaction).filter(
+              Transaction.transaction_id == current
+          ).first()
+          current = parent.parent_id if parent else None
+          hops += 1
+      chain.set(hops=hops)
+      return False
+
+def touch_ancestors(db: Session, parent_id: int, user_id: int) -> None:
+  """Bump updated_at along the parent chain so subtree (sum) ETags change"""
+  ancestors_query = text("""
+  WITH RECURSIVE ancestors AS (
+      SELECT transaction_id, parent_id
+      FROM transactions
+      WHERE transaction_id = :parent_id AND user_id = :user_id
+
+      UNION ALL
+
+      SELECT t.transaction_id, t.parent_id
+      FROM transactions t
+      INNER JOIN ancestors a ON t.transaction_id = a.parent_id
+      WHERE t.user_id = :user_id
+  )
+  SELECT transaction_id FROM ancestors;
+  """)
+  ancestor_ids = db.execute(
+      ancestors_query,
+      {"parent_id": parent_id, "user_id": user_id}
+  ).scalars().all()
+
+  if ancestor_ids:
+      db.query(Transaction).filter(
+          Transaction.transaction_id.in_(ancestor_ids)
+      ).update(
+          {Transaction.updated_at: datetime.now(timezone.utc)},
+          synchronize_session=False
+      )
+
+def encode_cursor(created_at: datetime, transaction_id: int) -> str:
+  raw = f"{created_at.isoformat()}|{transaction_id}"
+  return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+  try:
+      created_at, transaction_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+      return datetime.fromisoformat(created_at), int(transaction_id)
+  except ValueError:
+      raise HTTPException(
+          status_code=status.HTTP_400_BAD_REQUEST,
+          detail="Invalid cursor"
+      )
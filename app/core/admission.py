@@ -0,0 +1,171 @@
+# app/core/admission.py
+import asyncio
+import math
+import time
+from collections import deque
+from fastapi import HTTPException, status
+from fastapi_cache import FastAPICache
+from loguru import logger
+from app.core.config import settings
+from app.core.tracing import span
+
+class Overloaded(Exception):
+  pass
+
+class AdaptiveLimiter:
+  """
+  AIMD concurrency limit for one route class.
+  The limit grows by ~1 per window while latency stays under the target and
+  shrinks by `backoff` when it does not. Requests beyond the limit wait at
+  most `max_wait` seconds and are shed afterwards, or immediately when a
+  higher-priority class already has requests queued.
+  """
+
+  def __init__(
+      self,
+      name: str,
+      priority: int,
+      max_wait: float,
+      latency_target: float,
+      min_limit: int,
+      max_limit: int,
+      backoff: float = 0.9,
+  ):
+      self.name = name
+      self.priority = priority
+      self.max_wait = max_wait
+      self.latency_target = latency_target
+      self.min_limit = min_limit
+      self.max_limit = max_limit
+      self.backoff = backoff
+      self.limit = float(max_limit)
+      self.in_flight = 0
+      self.admitted = 0
+      self.shed = 0
+      self.latency_ewma = 0.0
+      self._waiters: deque[asyncio.Future] = deque()
+
+  @property
+  def queued(self) -> int:
+      return sum(1 for waiter in self._waiters if not waiter.done())
+
+  def retry_after(self) -> int:
+      """Seconds until a queued slot is likely free, at least 1"""
+      backlog = (self.queued + 1) / max(self.limit, 1)
+      return max(1, math.ceil(backlog * max(self.latency_ewma, self.latency_target)))
+
+  async def acquire(self, higher: list["AdaptiveLimiter"] = ()) -> None:
+      if self.in_flight < self.limit and not self.queued:
+          self.in_flight += 1
+          self.admitted += 1
+          return
+
+      if self.max_wait <= 0 or any(limiter.queued for limiter in higher):
+          self.shed += 1
+          raise Overloaded(self.name)
+
+      waiter = asyncio.get_running_loop().create_future()
+      self._waiters.append(waiter)
+      try:
+          # release() hands its slot over, so in_flight is already counted
+          await asyncio.wait_for(waiter, timeout=self.max_wait)
+      except asyncio.TimeoutError:
+          if waiter.cancelled() or not waiter.done():
+              self.shed += 1
+              raise Overloaded(self.name)
+      finally:
+          if waiter in self._waiters:
+              self._waiters.remove(waiter)
+      self.admitted += 1
+
+  def release(self, latency: float) -> None:
+      self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency if self.latency_ewma else latency
+      if latency > self.latency_target:
+          self.limit = max(self.min_limit, self.limit * self.backoff)
+      else:
+          self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+      # Past a shrunken limit the slot is retired instead of handed over;
+      # queued requests wait for a later release or are shed
+      while self.in_flight <= self.limit and self._waiters:
+          waiter = self._waiters.popleft()
+          if not waiter.done():
+              waiter.set_result(None)
+              return
+      self.in_flight -= 1
+
+  def stats(self) -> dict:
+      return {
+          "limit": round(self.limit, 2),
+          "in_flight": self.in_flight,
+          "queued": self.queued,
+          "admitted": self.admitted,
+          "shed": self.shed,
+          "latency_ms": round(self.latency_ewma * 1000, 1),
+      }
+
+def _limiter(name: str, priority: int, wait_share: float) -> AdaptiveLimiter:
+  return AdaptiveLimiter(
+      name=name,
+      priority=priority,
+      max_wait=settings.ADMISSION_QUEUE_TIMEOUT_MS / 1000 * wait_share,
+      latency_target=settings.ADMISSION_LATENCY_TARGET_MS / 1000,
+      min_limit=settings.ADMISSION_MIN_CONCURRENCY,
+      max_limit=settings.ADMISSION_MAX_CONCURRENCY,
+  )
+
+# Higher priority is shed last; tree reads (recursive sums, type scans) wait
+# the least and are shed first whenever cheaper classes are queueing.
+limiters: dict[str, AdaptiveLimiter] = {
+  "point": _limiter("point", priority=2, wait_share=1.0),
+  "write": _limiter("write", priority=1, wait_share=1.0),
+  "tree": _limiter("tree", priority=0, wait_share=0.25),
+}
+
+# Background job workers (app.core.jobs) pause while this Redis key exists
+JOB_PRESSURE_KEY = "jobs:pressure"
+_pressure_signalled_at = 0.0
+
+async def signal_pressure() -> None:
+  """Set JOB_PRESSURE_KEY after a shed, at most twice per pause window"""
+  global _pressure_signalled_at
+  now = time.monotonic()
+  if now - _pressure_signalled_at < settings.JOB_PRESSURE_PAUSE_MS / 2000:
+      return
+  _pressure_signalled_at = now
+  try:
+      redis = FastAPICache.get_backend().redis
+      await redis.set(JOB_PRESSURE_KEY, "1", px=settings.JOB_PRESSURE_PAUSE_MS)
+  except Exception:
+      pass
+
+def admit(route_class: str):
+  """Route dependency that holds a concurrency slot for the request"""
+  limiter = limiters[route_class]
+  higher = [other for other in limiters.values() if other.priority > limiter.priority]
+
+  async def dependency():
+      if not settings.ADMISSION_ENABLED:
+          yield
+          return
+      try:
+          with span("admission.wait", route_class=route_class):
+              await limiter.acquire(higher)
+      except Overloaded:
+          logger.warning(f"Shedding {route_class} request: limit {limiter.limit:.1f}, queued {limiter.queued}")
+          await signal_pressure()
+          raise HTTPException(
+              status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+              detail="Service overloaded, retry later",
+              headers={"Retry-After": str(limiter.retry_after())},
+          )
+      start = time.monotonic()
+      try:
+          yield
+      finally:
+          limiter.release(time.monotonic() - start)
+
+  return dependency
+
+def admission_stats() -> dict:
+  return {name: limiter.stats() for name, limiter in limiters.items()}
@@ -0,0 +1,415 @@
+# app/core/archive.py
+import argparse
+import json
+import time
+import zlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+from sqlalchemy import create_engine, func, insert, or_, text
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.sharding import shard_router
+from app.core.tracing import span
+from app.database import Base, SessionLocal
+from app.models.transaction import ArchivedTransaction, ArchivedTree, Transaction, User
+
+def subtree_levels(db: Session, root_ids: list[int], user_id: int, *columns) -> list[list]:
+  """Rows of the trees under `root_ids`, level by level from the roots down"""
+  columns = columns or (Transaction,)
+  if not root_ids:
+      return []
+  levels = [db.query(*columns).filter(
+      Transaction.transaction_id.in_(root_ids),
+      Transaction.user_id == user_id
+  ).all()]
+  while levels[-1]:
+      levels.append(db.query(*columns).filter(
+          Transaction.parent_id.in_([row.transaction_id for row in levels[-1]]),
+          Transaction.user_id == user_id
+      ).all())
+  return levels[:-1]
+
+def _pack(rows: list[Transaction]) -> bytes:
+  """
+  Column-oriented, zlib-compressed rows: one array per column and the
+  types dictionary-encoded, so repeated values compress to almost nothing.
+  Rows keep their level order, parents first, for restoring.
+  """
+  types = sorted({row.type for row in rows})
+  codes = {name: code for code, name in enumerate(types)}
+  columns = {
+      "transaction_id": [row.transaction_id for row in rows],
+      "parent_id": [row.parent_id for row in rows],
+      "amount": [row.amount for row in rows],
+      "types": types,
+      "type": [codes[row.type] for row in rows],
+      "created_at": [row.created_at.isoformat() if row.created_at else None for row in rows],
+      "updated_at": [row.updated_at.isoformat() if row.updated_at else None for row in rows],
+  }
+  return zlib.compress(json.dumps(columns, separators=(",", ":")).encode(), 9)
+
+def _unpack(payload: bytes) -> list[dict]:
+  with span("archive.unpack") as unpacked:
+      columns = json.loads(zlib.decompress(payload))
+      parse = lambda value: datetime.fromisoformat(value) if value else None
+      rows = [
+          {
+              "transaction_id": transaction_id,
+              "parent_id": parent_id,
+              "amount": amount,
+              "type": columns["types"][code],
+              "created_at": parse(created_at),
+              "updated_at": parse(updated_at),
+          }
+          for transaction_id, parent_id, amount, code, created_at, updated_at in zip(
+              columns["transaction_id"], columns["parent_id"], columns["amount"],
+              columns["type"], columns["created_at"], columns["updated_at"]
+          )
+      ]
+      unpacked.set(rows=len(rows), bytes=len(payload))
+  return rows
+
+def as_utc(value: datetime) -> datetime:
+  # SQLite hands back naive datetimes for timezone-aware columns
+  return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def listing_key(created_at: datetime, transaction_id: int) -> tuple[datetime, int]:
+  """Listing order, comparable across naive and aware datetimes"""
+  return as_utc(created_at), transaction_id
+
+def settled_roots(db: Session, user_id: int, before: datetime, after: int | None, limit: int | None) -> list[int]:
+  """
+  Unarchived roots, by id after `after`, whose tree was last written before
+  `before`. touch_ancestors keeps a root's updated_at at its tree's newest write.
+  """
+  query = db.query(Transaction.transaction_id).outerjoin(
+      ArchivedTree, ArchivedTree.root_id == Transaction.transaction_id
+  ).filter(
+      Transaction.user_id == user_id,
+      Transaction.parent_id.is_(None),
+      func.coalesce(Transaction.updated_at, Transaction.created_at) < before,
+      ArchivedTree.root_id.is_(None)
+  )
+  if after is not None:
+      query = query.filter(Transaction.transaction_id > after)
+  return [row.transaction_id for row in query.order_by(Transaction.transaction_id).limit(limit)]
+
+def archive_tree(
+  db: Session,
+  root_id: int,
+  user_id: int,
+  before: datetime | None = None,
+  batch_size: int = 1000
+) -> ArchivedTree | None:
+  """
+  Move the descendants of `root_id` into an ArchivedTree and return it, or
+  None for a childless root or one written to since `before`. Does not commit.
+  The root row stays locked until commit: touch_ancestors updates it on
+  every write to the tree, so a concurrent write either lands first and is
+  seen here, or waits and then finds the tree archived.
+  """
+  root = db.query(Transaction).filter(
+      Transaction.transaction_id == root_id,
+      Transaction.user_id == user_id
+  ).with_for_update().first()
+  if root is None or (before is not None and as_utc(root.updated_at or root.created_at) >= as_utc(before)):
+      return None
+  levels = subtree_levels(db, [root_id], user_id)
+  if len(levels) < 2:
+      return None
+  rows = [row for level in levels for row in level]
+  descendants = rows[1:]
+
+  breakdown: dict[str, dict] = defaultdict(lambda: {"count": 0, "sum": 0.0})
+  for row in rows:
+      breakdown[row.type]["count"] += 1
+      breakdown[row.type]["sum"] += row.amount
+  created = [row.created_at for row in descendants if row.created_at is not None]
+  tree = ArchivedTree(
+      root_id=root_id,
+      user_id=user_id,
+      subtree_sum=sum(row.amount for row in rows),
+      row_count=len(rows),
+      type_breakdown=dict(breakdown),
+      first_created_at=min(created, key=as_utc, default=None),
+      last_created_at=max(created, key=as_utc, default=None),
+      payload=_pack(descendants),
+  )
+  db.add(tree)
+  db.flush()
+  db.execute(insert(ArchivedTransaction), [
+      {"transaction_id": row.transaction_id, "root_id": root_id, "type": row.type} for row in descendants
+  ])
+  # Children before parents, for the parent_id foreign key
+  for level in reversed(levels[1:]):
+      ids = [row.transaction_id for row in level]
+      for start in range(0, len(ids), batch_size):
+          db.query(Transaction).filter(
+              Transaction.transaction_id.in_(ids[start:start + batch_size])
+          ).delete(synchronize_session=False)
+  for row in rows:
+      db.expunge(row)
+  return tree
+
+def restore_tree(db: Session, root_id: int, batch_size: int = 1000) -> int:
+  """Put an archived tree's rows back into `transactions`; returns the row count. Does not commit."""
+  tree = db.get(ArchivedTree, root_id)
+  if tree is None:
+      raise ValueError(f"Tree {root_id} is not archived")
+  rows = _unpack(tree.payload)
+  for start in range(0, len(rows), batch_size):
+      db.execute(insert(Transaction), [
+          {**row, "user_id": tree.user_id} for row in rows[start:start + batch_size]
+      ])
+  db.query(ArchivedTransaction).filter(
+      ArchivedTransaction.root_id == root_id
+  ).delete(synchronize_session=False)
+  db.delete(tree)
+  return len(rows)
+
+def _archived_tree(db: Session, transaction_id: int, user_id: int) -> ArchivedTree | None:
+  """The archived tree holding a descendant `transaction_id`, if any"""
+  return db.query(ArchivedTree).join(
+      ArchivedTransaction, ArchivedTransaction.root_id == ArchivedTree.root_id
+  ).filter(
+      ArchivedTransaction.transaction_id == transaction_id,
+      ArchivedTree.user_id == user_id
+  ).first()
+
+def is_archived(db: Session, transaction_id: int) -> bool:
+  """True when the id is taken by an archived row or roots an archived tree"""
+  return (
+      db.get(ArchivedTransaction, transaction_id) is not None
+      or db.get(ArchivedTree, transaction_id) is not None
+  )
+
+def archived_version(db: Session, transaction_id: int, user_id: int) -> datetime | None:
+  """Archived rows are immutable until restored; archived_at versions them"""
+  tree = _archived_tree(db, transaction_id, user_id)
+  return tree.archived_at if tree else None
+
+def archived_transaction(db: Session, transaction_id: int, user_id: int) -> dict | None:
+  tree = _archived_tree(db, transaction_id, user_id)
+  if tree is None:
+      return None
+  for row in _unpack(tree.payload):
+      if row["transaction_id"] == transaction_id:
+          return {**row, "user_id": user_id}
+  return None
+
+def archived_sum(db: Session, transaction_id: int, user_id: int) -> float | None:
+  """Subtree sum of an archived descendant, computed from its tree's payload"""
+  tree = _archived_tree(db, transaction_id, user_id)
+  if tree is None:
+      return None
+  rows = _unpack(tree.payload)
+  amounts = {row["transaction_id"]: row["amount"] for row in rows}
+  children = defaultdict(list)
+  for row in rows:
+      children[row["parent_id"]].append(row["transaction_id"])
+  total, pending = 0.0, [transaction_id]
+  while pending:
+      current = pending.pop()
+      total += amounts[current]
+      pending += children[current]
+  return total
+
+def archived_ids_of_type(db: Session, user_id: int, transaction_type: str) -> list[int]:
+  """Archived descendants of a type, from the id index without unpacking any tree"""
+  return [
+      row.transaction_id
+      for row in db.query(ArchivedTransaction.transaction_id).join(
+          ArchivedTree, ArchivedTree.root_id == ArchivedTransaction.root_id
+      ).filter(
+          ArchivedTree.user_id == user_id,
+          ArchivedTransaction.type == transaction_type
+      ).order_by(ArchivedTransaction.root_id, ArchivedTransaction.transaction_id)
+  ]
+
+def archived_page(
+  db: Session,
+  user_id: int,
+  limit: int,
+  since: datetime | None = None,
+  until: datetime | None = None,
+  transaction_type: str | None = None,
+  parent_id: int | None = None,
+  after: tuple[datetime, int] | None = None,
+  upto: datetime | None = None
+) -> list[dict]:
+  """
+  The first `limit` archived descendants matching a listing's filters, by
+  (created_at, transaction_id) after the `after` key and created at most
+  `upto`. Trees are unpacked oldest first, only where their created_at
+  range overlaps the window, until no later tree can make the page.
+  """
+  query = db.query(ArchivedTree).filter(ArchivedTree.user_id == user_id)
+  lower = max((value for value in (since, after and after[0]) if value is not None), key=as_utc, default=None)
+  if lower is not None:
+      query = query.filter(or_(ArchivedTree.last_created_at.is_(None), ArchivedTree.last_created_at >= lower))
+  if until is not None:
+      query = query.filter(or_(ArchivedTree.first_created_at.is_(None), ArchivedTree.first_created_at < until))
+  if upto is not None:
+      query = query.filter(or_(ArchivedTree.first_created_at.is_(None), ArchivedTree.first_created_at <= upto))
+  if parent_id is not None:
+      # Children of an archived row, or of an archived tree's root
+      holder = _archived_tree(db, parent_id, user_id)
+      query = query.filter(ArchivedTree.root_id == (holder.root_id if holder else parent_id))
+
+  key = lambda row: listing_key(row["created_at"], row["transaction_id"])
+  found: list[dict] = []
+  # Trees without a range first: they cannot be ruled out
+  for tree in query.order_by(
+      ArchivedTree.first_created_at.isnot(None), ArchivedTree.first_created_at, ArchivedTree.root_id
+  ).all():
+      if (
+          len(found) >= limit and tree.first_created_at is not None
+          and as_utc(tree.first_created_at) > key(found[limit - 1])[0]
+      ):
+          break
+      if transaction_type is not None and transaction_type not in tree.type_breakdown:
+          continue
+      for row in _unpack(tree.payload):
+          if (
+              row["created_at"] is None
+              or (since is not None and as_utc(row["created_at"]) < as_utc(since))
+              or (until is not None and as_utc(row["created_at"]) >= as_utc(until))
+              or (upto is not None and as_utc(row["created_at"]) > as_utc(upto))
+              or (transaction_type is not None and row["type"] != transaction_type)
+              or (parent_id is not None and row["parent_id"] != parent_id)
+              or (after is not None and key(row) <= listing_key(*after))
+          ):
+              continue
+          found.append({**row, "user_id": user_id})
+      found = sorted(found, key=key)[:limit]
+  return found
+
+def _storage(db: Session, table: str = "transactions") -> dict:
+  """Bytes used by a table and by its indexes"""
+  if db.get_bind().dialect.name == "postgresql":
+      row = db.execute(
+          text("SELECT pg_table_size(:table) AS heap, pg_indexes_size(:table) AS indexes"),
+          {"table": table}
+      ).one()
+      return {"table_bytes": row.heap, "index_bytes": row.indexes}
+  # SQLite: page usage from the dbstat virtual table
+  sizes = dict(db.execute(text("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")).all())
+  indexes = db.execute(
+      text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+      {"table": table}
+  ).scalars().all()
+  return {
+      "table_bytes": sizes.get(table, 0),
+      "index_bytes": sum(sizes.get(name, 0) for name in indexes),
+  }
+
+def _vacuum(bind, full: bool = False) -> float:
+  statement = "VACUUM"
+  if bind.dialect.name == "postgresql":
+      statement = "VACUUM FULL transactions" if full else "VACUUM transactions"
+  with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+      started = time.perf_counter()
+      connection.execute(text(statement))
+      return round(time.perf_counter() - started, 3)
+
+def benchmark(url: str, trees: int, fanout: int, depth: int) -> dict:
+  """
+  Seed `trees` settled trees into an empty scratch database at `url`, then
+  compare the transactions table/index size and VACUUM time before and
+  after archiving them. Run it against a throwaway database only.
+  """
+  bind = create_engine(url)
+  Base.metadata.create_all(bind=bind)
+  db = sessionmaker(autoflush=False, bind=bind)()
+  try:
+      db.add(User(id=1, email="archive-benchmark@example.com", hashed_password="x", is_active=True))
+      created_at = datetime.now(timezone.utc) - timedelta(days=365)
+      next_id = 1
+      for _ in range(trees):
+          root_id, level = next_id, [next_id]
+          rows = [{"transaction_id": root_id, "amount": 100.0, "type": "root", "parent_id": None}]
+          next_id += 1
+          for _ in range(depth):
+              children = []
+              for parent_id in level:
+                  for child in range(fanout):
+                      rows.append({
+                          "transaction_id": next_id, "amount": 1.0 + child,
+                          "type": ("cars", "shopping", "food")[child % 3], "parent_id": parent_id,
+                      })
+                      children.append(next_id)
+                      next_id += 1
+              level = children
+          db.execute(insert(Transaction), [{**row, "user_id": 1, "created_at": created_at} for row in rows])
+      db.commit()
+
+      _vacuum(bind, full=True)
+      with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+          connection.execute(text("ANALYZE"))
+      before = {**_storage(db), "rows": next_id - 1}
+      db.commit()
+      before["vacuum_seconds"] = _vacuum(bind)
+      archived = 0
+      while True:
+          roots = settled_roots(db, 1, datetime.now(timezone.utc), None, 100)
+          if not roots:
+              break
+          for root_id in roots:
+              archived += archive_tree(db, root_id, 1) is not None
+          db.commit()
+      _vacuum(bind, full=True)
+      after = {**_storage(db), "rows": db.query(func.count(Transaction.transaction_id)).scalar()}
+      # What the archive costs in exchange: summaries, payloads and the id lookup
+      archive = {
+          table: sum(_storage(db, table).values())
+          for table in ("archived_trees", "archived_transactions")
+      }
+      db.commit()
+      after["vacuum_seconds"] = _vacuum(bind)
+      return {"trees_archived": archived, "before": before, "after": after, "archive_bytes": archive}
+  finally:
+      db.close()
+      bind.dispose()
+
+def main(argv: list[str] | None = None) -> None:
+  """
+  Archive tooling: `python -m app.core.archive {restore,benchmark} ...`.
+  Archiving itself runs as the `archive_settled_trees` background job.
+  """
+  parser = argparse.ArgumentParser(prog="python -m app.core.archive")
+  commands = parser.add_subparsers(dest="command", required=True)
+  restore = commands.add_parser("restore", help="restore a user's archived trees into transactions")
+  restore.add_argument("user_id", type=int)
+  restore.add_argument("root_ids", type=int, nargs="*", help="default: all of the user's archived trees")
+  bench = commands.add_parser("benchmark", help="measure index size and VACUUM time before/after archiving")
+  bench.add_argument("url", help="scratch database URL; it is written to")
+  bench.add_argument("--trees", type=int, default=2000)
+  bench.add_argument("--fanout", type=int, default=5)
+  bench.add_argument("--depth", type=int, default=2)
+  args = parser.parse_args(argv)
+
+  if args.command == "benchmark":
+      print(json.dumps(benchmark(args.url, args.trees, args.fanout, args.depth), indent=2))
+      return
+
+  primary = SessionLocal()
+  try:
+      shard = shard_router.shard_for(args.user_id, primary)
+  finally:
+      primary.close()
+  db = shard_router.sessionmakers[shard]()
+  try:
+      root_ids = args.root_ids or [
+          row.root_id for row in db.query(ArchivedTree.root_id).filter(ArchivedTree.user_id == args.user_id)
+      ]
+      restored = 0
+      for root_id in root_ids:
+          restored += restore_tree(db, root_id)
+          db.commit()
+      logger.info(f"Restored {restored} transactions in {len(root_ids)} trees of user {args.user_id}")
+      print(f"Restored {restored} transactions in {len(root_ids)} trees")
+  finally:
+      db.close()
+
+if __name__ == "__main__":
+  main()
@@ -7,6 +7,7 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.core.tracing import span
 from app.database import get_db
 from app.models.transaction import User
 from app.schemas.user import Token, TokenData, UserCreate, User as UserSchema
@@ -55,11 +56,12 @@ async def get_current_user(
       headers={"WWW-Authenticate": "Bearer"},
   )
   try:
-      payload = jwt.decode(
-          token, 
-          settings.SECRET_KEY, 
-          algorithms=[settings.ALGORITHM]
-      )
+      with span("auth.jwt_decode"):
+          payload = jwt.decode(
+              token, 
+              settings.SECRET_KEY, 
+              algorithms=[settings.ALGORITHM]
+          )
       email: str = payload.get("sub")
       if email is None:
           raise credentials_exception
@@ -67,7 +69,9 @@ async def get_current_user(
   except JWTError:
       raise credentials_exception
 
-  user = get_user(db, email=token_data.email)
+  with span("auth.user_lookup") as lookup:
+      user = get_user(db, email=token_data.email)
+      lookup.set(found=user is not None)
   if user is None:
       raise credentials_exception
   return user
@@ -1,10 +1,244 @@
 # app/core/cache.py
+import asyncio
+import random
+import time
+from collections import Counter
+from functools import wraps
+from inspect import Parameter, iscoroutinefunction
+from typing import Any, Callable, Dict, Optional, Tuple
+from uuid import uuid4
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.dependencies.utils import get_typed_signature
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
-from fastapi_cache.decorator import cache
+from loguru import logger
 from redis import asyncio as aioredis
+from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.core.tracing import span
+from app.database import SessionLocal
+
+# hit / miss / stale_served / refreshed / coalesced_local / coalesced_remote
+stats: Counter = Counter()
+_inflight: dict[str, asyncio.Future] = {}
+_refreshes: set[asyncio.Task] = set()
+# Wall clock of the freshness stamps; tests move it instead of time.time
+_now = time.time
+
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+def user_key_builder(
+  func: Callable[..., Any],
+  namespace: str = "",
+  *,
+  request: Optional[Request] = None,
+  response: Optional[Response] = None,
+  args: Tuple[Any, ...],
+  kwargs: Dict[str, Any],
+) -> str:
+  """
+  Key cached responses by endpoint, user and scalar (path/query) params.
+  The default builder stringifies the db session and user objects, which
+  differ per request. When `@conditional` ran first, its ETag is part of
+  the key, so a new version never reads an older cached body.
+  """
+  user = kwargs.get("current_user")
+  params = sorted(
+      (name, value) for name, value in kwargs.items()
+      if isinstance(value, (int, float, str))
+  )
+  etag = getattr(request.state, "etag", "") if request is not None else ""
+  return (
+      f"{namespace}:{func.__module__}:{func.__name__}:"
+      f"{getattr(user, 'id', '')}:{params}:{etag}"
+  )
 
 async def setup_cache():
-  redis = aioredis.from_url(settings.REDIS_URL, encoding="utf8", decode_responses=True)
-  FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
\ No newline at end of file
+  # fastapi_cache coders work on bytes, so responses must not be decoded
+  redis = aioredis.from_url(settings.REDIS_URL)
+  FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache", key_builder=user_key_builder)
+
+async def cache_available() -> bool:
+  """Ping the Redis behind the cache backend"""
+  try:
+      backend = FastAPICache.get_backend()
+      return bool(await backend.redis.ping())
+  except Exception:
+      return False
+
+def cache_stats() -> dict:
+  return {**stats, "in_flight": len(_inflight)}
+
+def _jittered(seconds: float) -> float:
+  jitter = settings.CACHE_TTL_JITTER
+  return seconds * random.uniform(1 - jitter, 1 + jitter)
+
+def _pack(body: bytes, fresh_for: float) -> bytes:
+  """Prefix the encoded value with the time it stops being fresh"""
+  return f"{_now() + fresh_for:.3f}\n".encode() + body
+
+def _unpack(raw: bytes | str) -> tuple[float, bytes]:
+  if isinstance(raw, str):
+      raw = raw.encode()
+  fresh_until, _, body = raw.partition(b"\n")
+  return float(fresh_until), body
+
+async def _acquire_lock(key: str) -> str | None:
+  """
+  Redis lock so only one worker recomputes a key. Returns a token, "" when
+  there is no Redis to coordinate through, or None if another worker holds it.
+  """
+  redis = getattr(FastAPICache.get_backend(), "redis", None)
+  if redis is None:
+      return ""
+  token = uuid4().hex
+  try:
+      acquired = await redis.set(f"{key}:lock", token, nx=True, px=settings.CACHE_LOCK_TIMEOUT_MS)
+  except Exception:
+      return ""
+  return token if acquired else None
+
+async def _release_lock(key: str, token: str) -> None:
+  if not token:
+      return
+  try:
+      await FastAPICache.get_backend().redis.eval(_RELEASE_LOCK, 1, f"{key}:lock", token)
+  except Exception:
+      logger.warning(f"Error releasing cache lock '{key}:lock'")
+
+async def _get(key: str) -> bytes | None:
+  try:
+      return await FastAPICache.get_backend().get(key)
+  except Exception:
+      logger.warning(f"Error retrieving cache key '{key}' from backend")
+      return None
+
+async def _load(key: str, compute: Callable, expire: int) -> bytes:
+  """Compute, encode and store one entry; a worker holding the lock wins"""
+  token = await _acquire_lock(key)
+  if token is None:
+      stats["coalesced_remote"] += 1
+      deadline = time.monotonic() + settings.CACHE_LOCK_WAIT_MS / 1000
+      while time.monotonic() < deadline:
+          await asyncio.sleep(0.05)
+          raw = await _get(key)
+          if raw is not None and _unpack(raw)[0] > _now():
+              return _unpack(raw)[1]
+      # The holder is slow or gone; compute rather than fail the request
+
+  try:
+      with span("cache.compute"):
+          body = FastAPICache.get_coder().encode(await compute())
+      fresh_for = _jittered(expire)
+      try:
+          with span("cache.set", bytes=len(body)):
+              await FastAPICache.get_backend().set(
+                  key, _pack(body, fresh_for), int(fresh_for + settings.CACHE_STALE_SECONDS)
+              )
+      except Exception:
+          logger.warning(f"Error setting cache key '{key}' in backend")
+      return body
+  finally:
+      await _release_lock(key, token or "")
+
+async def _single_flight(key: str, load: Callable) -> bytes:
+  """Concurrent callers for the same key in this process share one load"""
+  future = _inflight.get(key)
+  if future is not None:
+      stats["coalesced_local"] += 1
+  else:
+      future = asyncio.ensure_future(load())
+      _inflight[key] = future
+      future.add_done_callback(lambda _: _inflight.pop(key, None))
+  return await asyncio.shield(future)
+
+def cache(expire: int = 300, namespace: str = ""):
+  """
+  Cache a GET endpoint in the FastAPICache backend, like fastapi_cache's
+  decorator, with three additions against thundering herds:
+  - misses for the same key are coalesced in-process and, through a Redis
+    lock, across workers, so only one request runs the query;
+  - entries stay servable for CACHE_STALE_SECONDS past `expire`; a stale hit
+    is answered immediately and refreshed in the background;
+  - the fresh window is jittered by CACHE_TTL_JITTER so keys written
+    together do not expire together.
+  """
+  injected_request = Parameter("__cache_request", Parameter.KEYWORD_ONLY, annotation=Request)
+  injected_response = Parameter("__cache_response", Parameter.KEYWORD_ONLY, annotation=Response)
+
+  def wrapper(func):
+      wrapped_signature = get_typed_signature(func)
+      own_params = {param.name for param in wrapped_signature.parameters.values()}
+
+      async def call(kwargs: dict):
+          kwargs = {name: value for name, value in kwargs.items() if name in own_params}
+          if iscoroutinefunction(func):
+              return await func(**kwargs)
+          return await run_in_threadpool(func, **kwargs)
+
+      async def refresh(key: str, kwargs: dict):
+          # The request's session is closed by then; open a fresh one on the same database
+          sessions = {
+              name: SessionLocal(bind=value.get_bind())
+              for name, value in kwargs.items() if isinstance(value, Session)
+          }
+          try:
+              await _single_flight(key, lambda: _load(key, lambda: call({**kwargs, **sessions}), expire))
+              stats["refreshed"] += 1
+          except Exception as e:
+              logger.warning(f"Background refresh of '{key}' failed: {str(e)}")
+          finally:
+              for session in sessions.values():
+                  session.close()
+
+      @wraps(func)
+      async def inner(*args, **kwargs):
+          request: Request = kwargs.pop(injected_request.name)
+          response: Response = kwargs.pop(injected_response.name)
+          if request.method != "GET" or request.headers.get("Cache-Control") == "no-store":
+              return await call(kwargs)
+
+          key = FastAPICache.get_key_builder()(
+              func,
+              f"{FastAPICache.get_prefix()}:{namespace}",
+              request=request,
+              response=response,
+              args=args,
+              kwargs=kwargs,
+          )
+          with span("cache.get") as lookup:
+              raw = await _get(key)
+
+          if raw is None:
+              stats["miss"] += 1
+              cache_status = "MISS"
+              body = await _single_flight(key, lambda: _load(key, lambda: call(kwargs), expire))
+          else:
+              fresh_until, body = _unpack(raw)
+              if fresh_until > _now():
+                  stats["hit"] += 1
+                  cache_status = "HIT"
+              else:
+                  stats["stale_served"] += 1
+                  cache_status = "STALE"
+                  if key not in _inflight:
+                      task = asyncio.create_task(refresh(key, kwargs))
+                      _refreshes.add(task)
+                      task.add_done_callback(_refreshes.discard)
+
+          lookup.set(status=cache_status)
+          response.headers[FastAPICache.get_cache_status_header()] = cache_status
+          return FastAPICache.get_coder().decode(body)
+
+      inner.__signature__ = wrapped_signature.replace(
+          parameters=[*wrapped_signature.parameters.values(), injected_request, injected_response]
+      )
+      return inner
+
+  return wrapper
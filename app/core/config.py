@@ -11,6 +11,69 @@ class Settings(BaseSettings):
   ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
   REDIS_URL: str = "redis://redis:6379"
 
+  # User-based sharding: transactions live on SHARD_DATABASE_URLS (JSON list),
+  # users and the shard directory on DATABASE_URL. Empty means one database.
+  SHARD_DATABASE_URLS: list[str] = []
+  SHARD_VIRTUAL_NODES: int = 64
+  SHARD_DIRECTORY_CACHE_SECONDS: int = 5
+
+  # Response cache: stale-while-revalidate window, TTL jitter and the Redis
+  # lock that keeps workers from recomputing the same key concurrently
+  CACHE_STALE_SECONDS: int = 60
+  CACHE_TTL_JITTER: float = 0.1
+  CACHE_LOCK_TIMEOUT_MS: int = 5000
+  CACHE_LOCK_WAIT_MS: int = 2000
+
+  # Transactional outbox relay and change feed
+  OUTBOX_POLL_INTERVAL_MS: int = 200
+  OUTBOX_BATCH_SIZE: int = 500
+  OUTBOX_GAP_SETTLE_MS: int = 2000
+  OUTBOX_GAP_RECHECK_SECONDS: int = 300
+  OUTBOX_RETENTION_HOURS: int = 72
+  CHANGE_FEED_QUEUE_SIZE: int = 1000
+  CHANGE_FEED_HEARTBEAT_SECONDS: int = 15
+
+  # Background jobs (python -m app.core.jobs worker): chunk size adapts to
+  # JOB_CHUNK_TARGET_MS, and jobs use at most JOB_DUTY_CYCLE of wall time and
+  # pause for JOB_PRESSURE_PAUSE_MS whenever a web worker sheds a request
+  JOB_WORKER_PROCESSES: int = 2
+  JOB_POLL_INTERVAL_MS: int = 1000
+  JOB_BATCH_SIZE: int = 500
+  JOB_CHUNK_TARGET_MS: int = 200
+  JOB_DUTY_CYCLE: float = 0.25
+  JOB_PRESSURE_PAUSE_MS: int = 2000
+  JOB_HEARTBEAT_TIMEOUT_SECONDS: int = 60
+  JOB_MAX_ATTEMPTS: int = 3
+
+  # Archival (archive_settled_trees job): roots whose tree has not been
+  # written to for this many days are settled
+  ARCHIVE_SETTLED_DAYS: int = 90
+
+  # Admission control / load shedding
+  ADMISSION_ENABLED: bool = True
+  ADMISSION_LATENCY_TARGET_MS: int = 250
+  ADMISSION_QUEUE_TIMEOUT_MS: int = 200
+  ADMISSION_MIN_CONCURRENCY: int = 2
+  ADMISSION_MAX_CONCURRENCY: int = 64
+  READINESS_POOL_SATURATION: float = 0.9
+
+  # Request tracing: sampled fraction, in-memory buffer and optional JSONL file.
+  # Traces cover every user's requests, so /debug/traces is off unless enabled
+  TRACE_SAMPLE_RATE: float = 0.01
+  TRACE_BUFFER_SIZE: int = 1000
+  TRACE_EXPORT_PATH: str | None = None
+  TRACE_ENDPOINT_ENABLED: bool = False
+
+  # Server entry point (python -m app.server) and startup warm-up
+  SERVER_HOST: str = "0.0.0.0"
+  SERVER_PORT: int = 8000
+  WEB_CONCURRENCY: int = 1
+  GRACEFUL_SHUTDOWN_SECONDS: int = 30
+  STARTUP_DB_CONNECTIONS: int = 5
+  STARTUP_REDIS_CONNECTIONS: int = 5
+  CACHE_WARMUP_USERS: int = 0
+  CACHE_WARMUP_ROOTS: int = 10
+
   class Config:
       env_file = ".env"
 
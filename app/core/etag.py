@@ -0,0 +1,74 @@
+# app/core/etag.py
+from datetime import datetime
+from functools import wraps
+from inspect import isawaitable, signature
+from typing import Awaitable, Callable, Optional
+from fastapi import Request, Response, status
+from app.core.tracing import span
+
+EtagBuilder = Callable[..., Optional[str] | Awaitable[Optional[str]]]
+
+def make_etag(kind: str, transaction_id: int, version: datetime) -> str:
+  """Build a strong ETag from a transaction id and its version timestamp"""
+  return f'"{kind}-{transaction_id}-{int(version.timestamp() * 1_000_000)}"'
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+  """Weak comparison of an If-None-Match header against an ETag (RFC 7232)"""
+  if not if_none_match:
+      return False
+  if if_none_match.strip() == "*":
+      return True
+  opaque = etag.removeprefix("W/")
+  return any(
+      candidate.strip().removeprefix("W/") == opaque
+      for candidate in if_none_match.split(",")
+  )
+
+def _find_param(func: Callable, annotation: type) -> str | None:
+  for param in signature(func).parameters.values():
+      if param.annotation is annotation:
+          return param.name
+  return None
+
+def conditional(etag_builder: EtagBuilder):
+  """
+  Answer GET requests with 304 Not Modified when If-None-Match matches.
+  `etag_builder` receives the endpoint kwargs and returns the current ETag,
+  or None when the resource does not exist (the endpoint then runs as usual).
+  Place it above `@cache` so it can reuse the Request/Response parameters
+  that decorator injects; the computed ETag is stored on `request.state`
+  so cache keys can be versioned by it.
+  """
+  def wrapper(func):
+      request_name = _find_param(func, Request)
+      response_name = _find_param(func, Response)
+      if request_name is None or response_name is None:
+          raise TypeError(f"{func.__name__} must accept Request and Response (apply @cache first)")
+
+      @wraps(func)
+      async def inner(*args, **kwargs):
+          request: Request = kwargs[request_name]
+          response: Response = kwargs[response_name]
+
+          with span("etag.version") as version:
+              etag = etag_builder(**kwargs)
+              if isawaitable(etag):
+                  etag = await etag
+              version.set(etag=etag)
+          if etag is None:
+              return await func(*args, **kwargs)
+
+          request.state.etag = etag
+          headers = {"ETag": etag, "Cache-Control": "no-cache"}
+          if etag_matches(request.headers.get("if-none-match"), etag):
+              version.set(not_modified=True)
+              return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+          result = await func(*args, **kwargs)
+          response.headers.update(headers)
+          return result
+
+      inner.__signature__ = signature(func)
+      return inner
+
+  return wrapper
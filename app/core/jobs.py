@@ -0,0 +1,448 @@
+# app/core/jobs.py
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+from redis import Redis, RedisError
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.admission import JOB_PRESSURE_KEY
+from app.core.archive import archive_tree, as_utc, settled_roots, subtree_levels
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.core.sharding import ShardRouter, ShardUnavailable, shard_router
+from app.database import SessionLocal
+from app.models.transaction import Job, Transaction
+from app.schemas.job import ArchiveParams, NoParams
+
+FINISHED = ("cancelled", "succeeded", "failed")
+
+# A chunk function gets (shard session, user_id, params, cursor, batch_size)
+# and returns (next cursor or None when done, rows processed, result counts).
+# It must not commit: the runner commits it with the job's checkpoint.
+ChunkFunction = Callable[[Session, int, dict, dict | None, int], tuple[dict | None, int, dict]]
+
+class JobKind:
+  def __init__(
+      self,
+      name: str,
+      chunk: ChunkFunction,
+      count: Callable | None = None,
+      params: type[BaseModel] = NoParams,
+      public: bool = True
+  ):
+      self.name = name
+      self.chunk = chunk
+      self.count = count
+      self.params = params
+      self.public = public
+
+kinds: dict[str, JobKind] = {}
+
+def job_kind(name: str, count: Callable | None = None, params: type[BaseModel] = NoParams, public: bool = True):
+  """
+  Register a chunk function as a job kind; `count` gives the progress total,
+  `params` the model its params are validated against, and kinds that are
+  not `public` can only be submitted by operators (the CLI).
+  """
+  def register(chunk: ChunkFunction) -> ChunkFunction:
+      kinds[name] = JobKind(name, chunk, count, params, public)
+      return chunk
+  return register
+
+def _now() -> datetime:
+  return datetime.now(timezone.utc)
+
+def _merge(result: dict, found: dict) -> dict:
+  """Add counts and extend id samples (capped at 100) into the job result"""
+  merged = dict(result)
+  for key, value in found.items():
+      if isinstance(value, list):
+          merged[key] = (merged.get(key, []) + value)[:100]
+      else:
+          merged[key] = merged.get(key, 0) + value
+  return merged
+
+def _count_transactions(db: Session, user_id: int, params: dict) -> int:
+  return db.query(func.count(Transaction.transaction_id)).filter(
+      Transaction.user_id == user_id
+  ).scalar()
+
+@job_kind("consistency_check", count=_count_transactions)
+def check_consistency(db: Session, user_id: int, params: dict, cursor: dict | None, batch_size: int):
+  """Find transactions whose parent is missing or belongs to another user"""
+  query = db.query(Transaction.transaction_id, Transaction.parent_id).filter(
+      Transaction.user_id == user_id
+  )
+  if cursor is not None:
+      query = query.filter(Transaction.transaction_id > cursor["after"])
+  rows = query.order_by(Transaction.transaction_id).limit(batch_size).all()
+
+  parent_ids = {row.parent_id for row in rows if row.parent_id is not None}
+  owned = {
+      row.transaction_id for row in db.query(Transaction.transaction_id).filter(
+          Transaction.transaction_id.in_(parent_ids),
+          Transaction.user_id == user_id
+      )
+  } if parent_ids else set()
+  orphans = [row.transaction_id for row in rows if row.parent_id is not None and row.parent_id not in owned]
+
+  next_cursor = {"after": rows[-1].transaction_id} if len(rows) == batch_size else None
+  return next_cursor, len(rows), {"checked": len(rows), "orphans": orphans}
+
+@job_kind("recompute_subtree_versions", count=_count_transactions)
+def recompute_subtree_versions(db: Session, user_id: int, params: dict, cursor: dict | None, batch_size: int):
+  """
+  Rebuild each node's version (updated_at) as the newest write in its
+  subtree, which touch_ancestors maintains incrementally, for rows written
+  around it (shard moves, bulk imports). Sum ETags change where it repairs.
+  A chunk is `batch_size` roots with their whole subtrees.
+  """
+  query = db.query(Transaction.transaction_id).filter(
+      Transaction.user_id == user_id,
+      Transaction.parent_id.is_(None)
+  )
+  if cursor is not None:
+      query = query.filter(Transaction.transaction_id > cursor["after"])
+  roots = [row.transaction_id for row in query.order_by(Transaction.transaction_id).limit(batch_size)]
+
+  levels = subtree_levels(
+      db, roots, user_id,
+      Transaction.transaction_id, Transaction.parent_id, Transaction.created_at, Transaction.updated_at
+  )
+
+  newest: dict[int, datetime] = {}
+  repaired = 0
+  for level in reversed(levels):
+      for row in level:
+          stored = row.updated_at or row.created_at
+          version = newest.get(row.transaction_id)
+          if version is None or (stored is not None and as_utc(stored) >= as_utc(version)):
+              version = stored
+          else:
+              db.query(Transaction).filter(
+                  Transaction.transaction_id == row.transaction_id
+              ).update({Transaction.updated_at: version}, synchronize_session=False)
+              repaired += 1
+          if row.parent_id is not None and version is not None:
+              current = newest.get(row.parent_id)
+              if current is None or as_utc(version) > as_utc(current):
+                  newest[row.parent_id] = version
+
+  next_cursor = {"after": roots[-1]} if len(roots) == batch_size else None
+  processed = sum(len(level) for level in levels)
+  return next_cursor, processed, {"roots": len(roots), "repaired": repaired}
+
+def _count_settled_roots(db: Session, user_id: int, params: dict) -> int:
+  return len(settled_roots(db, user_id, _settled_before(params), None, None))
+
+def _settled_before(params: dict) -> datetime:
+  return _now() - timedelta(days=params.get("older_than_days") or settings.ARCHIVE_SETTLED_DAYS)
+
+# Archiving makes trees read-only and their reads slower, so operators decide
+@job_kind("archive_settled_trees", count=_count_settled_roots, params=ArchiveParams, public=False)
+def archive_settled_trees(db: Session, user_id: int, params: dict, cursor: dict | None, batch_size: int):
+  """
+  Move the descendants of settled roots (no writes for `older_than_days`,
+  default ARCHIVE_SETTLED_DAYS) into the compressed archive. A chunk is
+  `batch_size` roots; progress counts roots.
+  """
+  before = _settled_before(params)
+  roots = settled_roots(db, user_id, before, cursor and cursor["after"], batch_size)
+  # Settledness is checked again under each root's lock
+  trees = [archive_tree(db, root_id, user_id, before) for root_id in roots]
+  archived = [tree for tree in trees if tree is not None]
+  next_cursor = {"after": roots[-1]} if len(roots) == batch_size else None
+  return next_cursor, len(roots), {
+      "trees_archived": len(archived),
+      "rows_archived": sum(tree.row_count - 1 for tree in archived),
+  }
+
+def submit_job(db: Session, user_id: int, kind: str, params: dict | None = None, public: bool = False) -> Job:
+  """Queue a job; `public` submissions (the API) may only use public kinds"""
+  if kind not in kinds:
+      raise ValueError(f"Unknown job kind '{kind}'")
+  if public and not kinds[kind].public:
+      raise ValueError(f"Job kind '{kind}' can only be submitted by an operator")
+  try:
+      params = kinds[kind].params.model_validate(params or {}).model_dump(exclude_none=True)
+  except ValidationError as e:
+      problems = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+      raise ValueError(f"Invalid params for '{kind}': {problems}")
+  job = Job(kind=kind, user_id=user_id, params=params, status="queued", progress=0, attempts=0)
+  db.add(job)
+  db.commit()
+  db.refresh(job)
+  return job
+
+def cancel_job(db: Session, job: Job) -> Job:
+  """Queued jobs are cancelled at once; running ones at their next chunk"""
+  if job.status in FINISHED:
+      raise ValueError(f"Job {job.id} already {job.status}")
+  if job.status == "queued":
+      job.status = "cancelled"
+      job.finished_at = _now()
+  else:
+      job.status = "cancelling"
+  db.commit()
+  db.refresh(job)
+  return job
+
+def redis_pressure() -> Callable[[], bool]:
+  """True while a web worker has recently shed a request (see admission.signal_pressure)"""
+  client = Redis.from_url(settings.REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+  def under_pressure() -> bool:
+      try:
+          return bool(client.exists(JOB_PRESSURE_KEY))
+      except RedisError:
+          return False
+
+  return under_pressure
+
+class JobRunner:
+  """
+  Claims jobs from the `jobs` table and runs them chunk by chunk. A chunk is
+  committed together with the job's cursor, in one transaction when the
+  user's rows live on the primary, so a crashed job resumes after its last
+  committed chunk (on another shard a chunk may run twice, so chunks must be
+  idempotent). To leave the database to live traffic, the runner:
+  - halves the chunk size when a chunk ran over JOB_CHUNK_TARGET_MS and
+    grows it back slowly otherwise;
+  - sleeps between chunks so jobs use at most JOB_DUTY_CYCLE of wall time;
+  - pauses while web workers are shedding requests.
+  """
+
+  def __init__(
+      self,
+      session_factory: sessionmaker = SessionLocal,
+      router: ShardRouter = shard_router,
+      name: str | None = None,
+      pressure: Callable[[], bool] | None = None,
+      stop=None,
+  ):
+      self.session_factory = session_factory
+      self.router = router
+      self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+      self.pressure = pressure or redis_pressure()
+      self.stop = stop or threading.Event()
+      self.batch_size = settings.JOB_BATCH_SIZE
+
+  def claim(self) -> int | None:
+      """
+      Take the oldest queued job, or a running one whose worker stopped
+      heartbeating. The compare-and-set on `attempts` lets one worker win.
+      """
+      db = self.session_factory()
+      try:
+          now = _now()
+          stale = now - timedelta(seconds=settings.JOB_HEARTBEAT_TIMEOUT_SECONDS)
+          candidates = db.query(Job.id, Job.status, Job.attempts).filter(or_(
+              Job.status == "queued",
+              and_(Job.status.in_(("running", "cancelling")), Job.heartbeat_at < stale)
+          )).order_by(Job.id).limit(10).all()
+          for candidate in candidates:
+              claimed = db.query(Job).filter(
+                  Job.id == candidate.id,
+                  Job.status == candidate.status,
+                  Job.attempts == candidate.attempts
+              ).update({
+                  Job.status: "running" if candidate.status == "queued" else candidate.status,
+                  Job.attempts: candidate.attempts + 1,
+                  Job.worker: self.name,
+                  Job.heartbeat_at: now,
+              }, synchronize_session=False)
+              db.commit()
+              if claimed:
+                  return candidate.id
+          return None
+      finally:
+          db.close()
+
+  def _shard_session(self, db: Session, user_id: int) -> Session:
+      if not self.router.sharded:
+          return db
+      shard = self.router.shard_for(user_id, db)
+      if self.router.engines[shard] is db.get_bind():
+          return db
+      return self.router.sessionmakers[shard]()
+
+  def _finish(self, db: Session, job: Job, state: str) -> str:
+      job.status = state
+      job.finished_at = _now()
+      db.commit()
+      logger.info(f"Job {job.id} ({job.kind}) {state} after {job.progress} rows")
+      return state
+
+  def _hand_back(self, db: Session, job: Job) -> str:
+      """Requeue without counting the attempt (shutdown, user being moved)"""
+      job.status = "queued"
+      job.attempts -= 1
+      db.commit()
+      return "queued"
+
+  def _pace(self, elapsed: float) -> None:
+      if elapsed > settings.JOB_CHUNK_TARGET_MS / 1000:
+          self.batch_size = max(1, self.batch_size // 2)
+      else:
+          self.batch_size = min(settings.JOB_BATCH_SIZE, self.batch_size + max(1, settings.JOB_BATCH_SIZE // 10))
+      self.stop.wait(elapsed * (1 / settings.JOB_DUTY_CYCLE - 1))
+
+  def run(self, job_id: int) -> str:
+      """Run a claimed job until it finishes, is cancelled or handed back; returns its status"""
+      db = self.session_factory()
+      try:
+          job = db.get(Job, job_id)
+          attempt = job.attempts
+          kind = kinds.get(job.kind)
+          if job.status == "cancelling":
+              return self._finish(db, job, "cancelled")
+          if kind is None:
+              job.error = f"Unknown job kind '{job.kind}'"
+              return self._finish(db, job, "failed")
+          if attempt > settings.JOB_MAX_ATTEMPTS:
+              job.error = job.error or "Worker died too many times"
+              return self._finish(db, job, "failed")
+          job.started_at = job.started_at or _now()
+          db.commit()
+
+          while True:
+              db.refresh(job)
+              if job.attempts != attempt:
+                  logger.warning(f"Job {job_id} was reclaimed by {job.worker}")
+                  return job.status
+              if job.status == "cancelling":
+                  return self._finish(db, job, "cancelled")
+              if self.stop.is_set():
+                  return self._hand_back(db, job)
+              if self.pressure():
+                  job.heartbeat_at = _now()
+                  db.commit()
+                  self.stop.wait(settings.JOB_PRESSURE_PAUSE_MS / 1000)
+                  continue
+              try:
+                  shard_db = self._shard_session(db, job.user_id)
+              except ShardUnavailable:
+                  return self._hand_back(db, job)
+
+              started = time.monotonic()
+              try:
+                  if job.total is None and kind.count is not None:
+                      job.total = kind.count(shard_db, job.user_id, job.params)
+                  cursor, processed, found = kind.chunk(
+                      shard_db, job.user_id, job.params, job.cursor, self.batch_size
+                  )
+                  if shard_db is not db:
+                      shard_db.commit()
+              finally:
+                  if shard_db is not db:
+                      shard_db.close()
+
+              job.cursor = cursor
+              job.progress += processed
+              job.result = _merge(job.result or {}, found)
+              job.heartbeat_at = _now()
+              if cursor is None:
+                  return self._finish(db, job, "succeeded")
+              db.commit()
+              self._pace(time.monotonic() - started)
+      except Exception as e:
+          logger.error(f"Job {job_id} failed: {str(e)}")
+          db.rollback()
+          job = db.get(Job, job_id)
+          job.error = str(e)[:500]
+          if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+              return self._finish(db, job, "failed")
+          # Retried from its last checkpoint by the next claim
+          job.status = "queued"
+          db.commit()
+          return "queued"
+      finally:
+          db.close()
+
+def _work(stop) -> None:
+  """Body of one worker process: claim and run jobs until `stop` is set"""
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+  setup_logging()
+  runner = JobRunner(stop=stop)
+  logger.info(f"Job worker {runner.name} started")
+  while not stop.is_set():
+      try:
+          job_id = runner.claim()
+          if job_id is not None:
+              runner.run(job_id)
+              continue
+      except Exception as e:
+          logger.error(f"Job worker {runner.name}: {str(e)}")
+      stop.wait(settings.JOB_POLL_INTERVAL_MS / 1000)
+  logger.info(f"Job worker {runner.name} stopped")
+
+def run_workers(processes: int) -> None:
+  """
+  Run `processes` worker processes, separate from the web workers. On
+  SIGTERM/SIGINT each finishes its current chunk and requeues its job.
+  """
+  context = multiprocessing.get_context("spawn")
+  stop = context.Event()
+  workers = [
+      context.Process(target=_work, args=(stop,), name=f"job-worker-{index}")
+      for index in range(processes)
+  ]
+  for worker in workers:
+      worker.start()
+  signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+  signal.signal(signal.SIGINT, lambda signum, frame: stop.set())
+  for worker in workers:
+      worker.join()
+
+def _describe(job: Job) -> str:
+  return json.dumps({
+      "id": job.id,
+      "kind": job.kind,
+      "status": job.status,
+      "progress": job.progress,
+      "total": job.total,
+      "result": job.result,
+      "error": job.error,
+  })
+
+def main(argv: list[str] | None = None) -> None:
+  """Background jobs: `python -m app.core.jobs {worker,submit,status,cancel} ...`"""
+  parser = argparse.ArgumentParser(prog="python -m app.core.jobs")
+  commands = parser.add_subparsers(dest="command", required=True)
+  worker = commands.add_parser("worker", help="run job worker processes")
+  worker.add_argument("--processes", type=int, default=settings.JOB_WORKER_PROCESSES)
+  submit = commands.add_parser("submit", help="queue a job for a user")
+  submit.add_argument("kind", choices=sorted(kinds))
+  submit.add_argument("user_id", type=int)
+  submit.add_argument("--params", type=json.loads, default={})
+  commands.add_parser("status", help="show a job's progress").add_argument("job_id", type=int)
+  commands.add_parser("cancel", help="cancel a job").add_argument("job_id", type=int)
+  args = parser.parse_args(argv)
+
+  if args.command == "worker":
+      run_workers(args.processes)
+      return
+  db = SessionLocal()
+  try:
+      if args.command == "submit":
+          print(_describe(submit_job(db, args.user_id, args.kind, args.params)))
+          return
+      job = db.get(Job, args.job_id)
+      if job is None:
+          raise SystemExit(f"Job {args.job_id} not found")
+      print(_describe(cancel_job(db, job) if args.command == "cancel" else job))
+  finally:
+      db.close()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,282 @@
+# app/core/outbox.py
+import asyncio
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from fastapi.concurrency import run_in_threadpool
+from loguru import logger
+from sqlalchemy import func
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.config import settings
+from app.core.sharding import shard_router
+from app.models.transaction import OutboxEvent
+
+def read_events(
+  db: Session,
+  after: int,
+  limit: int,
+  user_id: int | None = None,
+  upto: int | None = None,
+  ids: list[int] | None = None
+) -> list[dict]:
+  """Outbox events with after < id <= upto (or in `ids`), oldest first, as plain dicts"""
+  query = db.query(OutboxEvent).filter(OutboxEvent.id > after)
+  if upto is not None:
+      query = query.filter(OutboxEvent.id <= upto)
+  if ids is not None:
+      query = query.filter(OutboxEvent.id.in_(ids))
+  if user_id is not None:
+      query = query.filter(OutboxEvent.user_id == user_id)
+  return [
+      {
+          "id": event.id,
+          "user_id": event.user_id,
+          "event_type": event.event_type,
+          "payload": event.payload,
+      }
+      for event in query.order_by(OutboxEvent.id).limit(limit).all()
+  ]
+
+def parse_offset(value: str) -> tuple[int | None, int]:
+  """
+  A feed offset as sent in SSE ids, "<shard>:<outbox id>". A bare outbox
+  id has no shard and is taken to be on the user's current shard.
+  """
+  shard, _, event_id = value.rpartition(":")
+  return (int(shard) if shard else None), int(event_id)
+
+def format_sse(event: dict, shard: int) -> str:
+  return f"id: {shard}:{event['id']}\nevent: {event['event_type']}\ndata: {json.dumps(event['payload'])}\n\n"
+
+def format_reset(shard: int, offset: int, reason: str) -> str:
+  """Tells the client its offset cannot be resumed: reload state, then follow from `offset`"""
+  return f"id: {shard}:{offset}\nevent: reset\ndata: {json.dumps({'reason': reason})}\n\n"
+
+class ChangeFeed:
+  """
+  Relays one shard's outbox rows to in-process subscribers, keyed by user.
+  Every worker runs one relay per shard for its own SSE connections, so
+  feed offsets are outbox ids of the user's shard, sent as "<shard>:<id>". A subscriber
+  whose queue overflows is dropped with a None sentinel; it reconnects with
+  Last-Event-ID and catches up from the outbox.
+
+  Delivery is at-least-once: ids are not commit-ordered, so an event that
+  commits after the relay moved past its id is still delivered, flagged
+  late, below the subscriber's offset.
+  """
+
+  def __init__(self, session_factory: sessionmaker | None = None, shard: int = 0):
+      self.session_factory = session_factory or shard_router.sessionmakers[shard]
+      self.shard = shard
+      self.last_id = 0
+      self._gap_seen_at: float | None = None
+      # id -> relay time: ids skipped as gaps, and skipped ids that showed up
+      self.skipped: dict[int, float] = {}
+      self.late: dict[int, float] = {}
+      self._subscribers: dict[int, set[asyncio.Queue]] = defaultdict(set)
+      self._task: asyncio.Task | None = None
+
+  def subscribe(self, user_id: int) -> asyncio.Queue:
+      queue = asyncio.Queue(maxsize=settings.CHANGE_FEED_QUEUE_SIZE)
+      self._subscribers[user_id].add(queue)
+      return queue
+
+  def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+      queues = self._subscribers.get(user_id)
+      if queues is not None:
+          queues.discard(queue)
+          if not queues:
+              del self._subscribers[user_id]
+
+  def publish(self, events: list[dict]) -> None:
+      for event in events:
+          for queue in list(self._subscribers.get(event["user_id"], ())):
+              try:
+                  queue.put_nowait(event)
+              except asyncio.QueueFull:
+                  logger.warning(f"Dropping slow change feed subscriber of user {event['user_id']}")
+                  self.unsubscribe(event["user_id"], queue)
+                  while not queue.empty():
+                      queue.get_nowait()
+                  queue.put_nowait(None)
+
+  def settled(self, events: list[dict], now: float) -> list[dict]:
+      """
+      Leading events that are safe to publish. Ids are assigned at insert but
+      become visible at commit, so a gap may be a transaction still in
+      flight: hold back at a gap until it is OUTBOX_GAP_SETTLE_MS old, then
+      move past it and keep re-checking the missing ids (see recover).
+      """
+      ready = []
+      expected = self.last_id + 1
+      for event in events:
+          if event["id"] != expected:
+              if self._gap_seen_at is None:
+                  self._gap_seen_at = now
+              if now - self._gap_seen_at < settings.OUTBOX_GAP_SETTLE_MS / 1000:
+                  break
+              # Sequence jumps can be large; only the first batch is tracked
+              for missing in range(expected, min(event["id"], expected + settings.OUTBOX_BATCH_SIZE)):
+                  self.skipped[missing] = now
+          self._gap_seen_at = None
+          ready.append(event)
+          expected = event["id"] + 1
+      return ready
+
+  def recover(self, events: list[dict], now: float) -> list[dict]:
+      """
+      Skipped ids that turned out to be slow commits, flagged late. Ids still
+      missing after OUTBOX_GAP_RECHECK_SECONDS are taken as rolled back.
+      """
+      late = []
+      for event in events:
+          del self.skipped[event["id"]]
+          self.late[event["id"]] = now
+          late.append({**event, "late": True})
+      horizon = now - settings.OUTBOX_GAP_RECHECK_SECONDS
+      for tracked in (self.skipped, self.late):
+          for expired in [id for id, seen_at in tracked.items() if seen_at < horizon]:
+              del tracked[expired]
+      return late
+
+  @property
+  def subscriber_count(self) -> int:
+      return sum(len(queues) for queues in self._subscribers.values())
+
+  def _start_offset(self) -> int:
+      db = self.session_factory()
+      try:
+          return db.query(func.max(OutboxEvent.id)).scalar() or 0
+      finally:
+          db.close()
+
+  def _read_batch(self) -> list[dict]:
+      db = self.session_factory()
+      try:
+          return read_events(db, self.last_id, settings.OUTBOX_BATCH_SIZE)
+      finally:
+          db.close()
+
+  def read_user_batch(self, user_id: int, after: int, upto: int) -> list[dict]:
+      db = self.session_factory()
+      try:
+          return read_events(db, after, settings.OUTBOX_BATCH_SIZE, user_id=user_id, upto=upto)
+      finally:
+          db.close()
+
+  def oldest_id(self) -> int:
+      """Smallest retained outbox id, or one past the relay's offset when none are"""
+      db = self.session_factory()
+      try:
+          return db.query(func.min(OutboxEvent.id)).scalar() or self.last_id + 1
+      finally:
+          db.close()
+
+  def read_ids(self, ids: list[int], user_id: int | None = None) -> list[dict]:
+      db = self.session_factory()
+      try:
+          return read_events(db, 0, len(ids), user_id=user_id, ids=ids)
+      finally:
+          db.close()
+
+  def _prune(self) -> int:
+      cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+      db = self.session_factory()
+      try:
+          deleted = db.query(OutboxEvent).filter(
+              OutboxEvent.created_at < cutoff
+          ).delete(synchronize_session=False)
+          db.commit()
+          return deleted
+      finally:
+          db.close()
+
+  async def run(self) -> None:
+      self.last_id = await run_in_threadpool(self._start_offset)
+      loop = asyncio.get_running_loop()
+      next_prune = loop.time()
+      while True:
+          try:
+              events = self.settled(await run_in_threadpool(self._read_batch), loop.time())
+              if events:
+                  self.publish(events)
+                  self.last_id = events[-1]["id"]
+              if self.skipped:
+                  found = await run_in_threadpool(self.read_ids, list(self.skipped))
+                  self.publish(self.recover(found, loop.time()))
+              if loop.time() >= next_prune:
+                  pruned = await run_in_threadpool(self._prune)
+                  if pruned:
+                      logger.info(f"Pruned {pruned} outbox events")
+                  next_prune = loop.time() + 60
+          except Exception as e:
+              logger.error(f"Outbox relay error: {str(e)}")
+              events = []
+          # A full batch means we are behind: read again right away
+          if len(events) < settings.OUTBOX_BATCH_SIZE:
+              await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL_MS / 1000)
+
+  def start(self) -> None:
+      if self._task is None:
+          self._task = asyncio.create_task(self.run())
+
+  async def stop(self) -> None:
+      if self._task is not None:
+          self._task.cancel()
+          try:
+              await self._task
+          except asyncio.CancelledError:
+              pass
+          self._task = None
+
+change_feeds = [ChangeFeed(factory, shard) for shard, factory in enumerate(shard_router.sessionmakers)]
+
+async def stream_changes(feed: ChangeFeed, user_id: int, after: int, reset: str | None = None):
+  """
+  SSE stream for one user: backfill from the outbox past `after`, then
+  follow the relay. The backfill stops at the relay's settled offset as of
+  subscribing; everything later arrives through the queue. Ids at or below
+  `after` that the relay skipped or delivered late are sent again, since a
+  resuming client may have disconnected before they committed. When
+  events past `after` were already pruned, or the caller passes a `reset`
+  reason (an offset from another shard), a reset event replaces the
+  backfill.
+  """
+  queue = feed.subscribe(user_id)
+  upto = feed.last_id
+  recheck = [id for id in (*feed.skipped, *feed.late) if id <= after]
+  try:
+      if reset is None and after < await run_in_threadpool(feed.oldest_id) - 1:
+          reset = "history_pruned"
+      if reset is not None:
+          logger.info(f"Resetting change feed offset {after} of user {user_id}: {reset}")
+          yield format_reset(feed.shard, upto, reset)
+          after, recheck = upto, []
+
+      if recheck:
+          for event in await run_in_threadpool(feed.read_ids, recheck, user_id):
+              yield format_sse(event, feed.shard)
+
+      while after < upto:
+          backlog = await run_in_threadpool(feed.read_user_batch, user_id, after, upto)
+          for event in backlog:
+              yield format_sse(event, feed.shard)
+              after = event["id"]
+          if len(backlog) < settings.OUTBOX_BATCH_SIZE:
+              break
+
+      while True:
+          try:
+              event = await asyncio.wait_for(queue.get(), timeout=settings.CHANGE_FEED_HEARTBEAT_SECONDS)
+          except asyncio.TimeoutError:
+              yield ": keep-alive\n\n"
+              continue
+          if event is None:
+              return
+          if event.get("late"):
+              yield format_sse(event, feed.shard)
+          elif event["id"] > after:
+              yield format_sse(event, feed.shard)
+              after = event["id"]
+  finally:
+      feed.unsubscribe(user_id, queue)
@@ -0,0 +1,388 @@
+# app/core/sharding.py
+import argparse
+import bisect
+import hashlib
+import time
+from typing import Annotated
+from fastapi import Depends, HTTPException, status
+from loguru import logger
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+from app.core.auth import get_current_active_user
+from app.core.config import settings
+from app.database import Base, SessionLocal, engine, get_db
+from app.models.transaction import ArchivedTransaction, ArchivedTree, ShardAssignment, Transaction, TransactionClaim, User
+
+class ShardUnavailable(Exception):
+  pass
+
+def _hash(value: str) -> int:
+  return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+class ShardRouter:
+  """
+  Maps a user_id to one of N databases holding that user's transactions.
+  Placement comes from a consistent-hash ring, so adding a shard moves only
+  ~1/N of users; rows in the `shard_directory` table on the primary database
+  override the ring for users that were rebalanced. Users, credentials and
+  the directory always live on the primary (DATABASE_URL).
+  """
+
+  def __init__(self, urls: list[str], virtual_nodes: int = 64, directory_ttl: float = 5):
+      self.engines: list[Engine] = [
+          engine if url == settings.DATABASE_URL else create_engine(url)
+          for url in urls
+      ]
+      self.sessionmakers = [
+          sessionmaker(autocommit=False, autoflush=False, bind=shard_engine)
+          for shard_engine in self.engines
+      ]
+      self.directory_ttl = directory_ttl
+      self._directory: dict[int, tuple[float, int | None, str]] = {}
+      self._known_users: set[tuple[int, int]] = set()
+      self.virtual_nodes = virtual_nodes
+      self._ring = self._build_ring(len(self.engines))
+
+  @property
+  def sharded(self) -> bool:
+      return len(self.engines) > 1
+
+  def _build_ring(self, shard_count: int) -> tuple[list[int], list[int]]:
+      ring = sorted(
+          (_hash(f"shard-{shard}-{node}"), shard)
+          for shard in range(shard_count)
+          for node in range(self.virtual_nodes)
+      )
+      return [point for point, _ in ring], [shard for _, shard in ring]
+
+  def ring_shard(self, user_id: int, shard_count: int | None = None) -> int:
+      """Ring placement; pass `shard_count` to see where an older, smaller ring put a user"""
+      points, shards = self._ring if shard_count is None else self._build_ring(shard_count)
+      return shards[bisect.bisect(points, _hash(str(user_id))) % len(points)]
+
+  def shard_for(self, user_id: int, db: Session) -> int:
+      """Directory entry if any (cached for directory_ttl seconds), else the ring"""
+      if not self.sharded:
+          return 0
+      cached = self._directory.get(user_id)
+      if cached is None or cached[0] < time.monotonic():
+          assignment = db.get(ShardAssignment, user_id)
+          shard, state = (assignment.shard, assignment.status) if assignment else (None, "active")
+          cached = (time.monotonic() + self.directory_ttl, shard, state)
+          self._directory[user_id] = cached
+      _, shard, state = cached
+      if state != "active":
+          raise ShardUnavailable(user_id)
+      return self.ring_shard(user_id) if shard is None else shard
+
+  def current_shard(self, user_id: int, db: Session) -> int:
+      """
+      Like shard_for, but reads the directory row uncached while holding a
+      shared lock on the user's row until `db` commits. move_user takes that
+      row for update to mark a user moving, so it waits for writes in flight
+      and any write that resolved its shard before the mark sees it here.
+      """
+      db.query(User.id).filter(User.id == user_id).with_for_update(read=True).first()
+      assignment = db.query(ShardAssignment).filter(
+          ShardAssignment.user_id == user_id
+      ).populate_existing().first()
+      if assignment is not None and assignment.status != "active":
+          raise ShardUnavailable(user_id)
+      return self.ring_shard(user_id) if assignment is None or assignment.shard is None else assignment.shard
+
+  def ensure_user(self, shard: int, shard_db: Session, user: User) -> None:
+      """Keep a copy of the user row on its shard for the transactions FK"""
+      if self.engines[shard] is engine or (shard, user.id) in self._known_users:
+          return
+      if shard_db.get(User, user.id) is None:
+          shard_db.add(User(
+              id=user.id,
+              email=user.email,
+              hashed_password=user.hashed_password,
+              is_active=user.is_active
+          ))
+          shard_db.commit()
+      self._known_users.add((shard, user.id))
+
+  def create_all(self) -> None:
+      for shard_engine in self.engines:
+          Base.metadata.create_all(bind=shard_engine)
+
+  def dispose(self) -> None:
+      for shard_engine in self.engines:
+          shard_engine.dispose()
+
+shard_router = ShardRouter(
+  settings.SHARD_DATABASE_URLS or [settings.DATABASE_URL],
+  virtual_nodes=settings.SHARD_VIRTUAL_NODES,
+  directory_ttl=settings.SHARD_DIRECTORY_CACHE_SECONDS,
+)
+
+def shard_unavailable() -> HTTPException:
+  """The 503 for requests of a user whose data is being moved"""
+  return HTTPException(
+      status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+      detail="User data is being moved, retry later",
+      headers={"Retry-After": str(settings.SHARD_DIRECTORY_CACHE_SECONDS)},
+  )
+
+def _shard_session(current_user: User, db: Session, write: bool):
+  if not shard_router.sharded:
+      yield db
+      return
+  try:
+      shard = shard_router.shard_for(current_user.id, db)
+      if write and shard_router.current_shard(current_user.id, db) != shard:
+          raise ShardUnavailable(current_user.id)
+  except ShardUnavailable:
+      raise shard_unavailable()
+  if shard_router.engines[shard] is engine:
+      yield db
+      return
+  shard_db = shard_router.sessionmakers[shard]()
+  try:
+      shard_router.ensure_user(shard, shard_db, current_user)
+      yield shard_db
+  finally:
+      shard_db.close()
+
+def get_shard_db(
+  current_user: Annotated[User, Depends(get_current_active_user)],
+  db: Session = Depends(get_db)
+):
+  """Session on the shard that holds the current user's transactions"""
+  yield from _shard_session(current_user, db, write=False)
+
+def get_write_shard_db(
+  current_user: Annotated[User, Depends(get_current_active_user)],
+  db: Session = Depends(get_db)
+):
+  """
+  get_shard_db for writes: the directory is re-checked under a lock on the
+  primary (see ShardRouter.current_shard), held until the primary session
+  commits, so commit the shard first.
+  """
+  yield from _shard_session(current_user, db, write=True)
+
+def claim_transaction_id(primary: Session, transaction_id: int, user_id: int) -> bool:
+  """
+  Claim a transaction id in `transaction_ids` on the primary; False if it is
+  taken. Ids stay unique across shards, so rows can move between shards
+  without key conflicts. The claim is flushed, not committed: it commits
+  with the row on a single database, after the shard write otherwise.
+  """
+  primary.add(TransactionClaim(transaction_id=transaction_id, user_id=user_id))
+  try:
+      primary.flush()
+  except IntegrityError:
+      primary.rollback()
+      return False
+  return True
+
+def _assign(db: Session, user_id: int, shard: int | None, state: str) -> None:
+  assignment = db.get(ShardAssignment, user_id)
+  if assignment is None:
+      assignment = ShardAssignment(user_id=user_id)
+      db.add(assignment)
+  assignment.shard = shard
+  assignment.status = state
+  db.commit()
+
+def _levels(rows: list[Transaction]) -> list[list[Transaction]]:
+  """Group rows by tree depth; inserting level by level satisfies parent_id"""
+  parents = {row.transaction_id: row.parent_id for row in rows}
+  depths: dict[int, int] = {}
+  for row in rows:
+      chain = []
+      current = row.transaction_id
+      while current in parents and current not in depths:
+          chain.append(current)
+          current = parents[current]
+      depth = depths.get(current, -1)
+      for node in reversed(chain):
+          depth += 1
+          depths[node] = depth
+
+  levels: list[list[Transaction]] = [[] for _ in range(max(depths.values(), default=-1) + 1)]
+  for row in rows:
+      levels[depths[row.transaction_id]].append(row)
+  return levels
+
+def move_user(user_id: int, target: int, router: ShardRouter = shard_router, batch_size: int = 1000) -> int:
+  """
+  Move one user's transactions to shard `target` and return the row count.
+  The user is marked "moving" first and requests for it get 503 until the
+  move is done. Marking locks the user's row, so it waits for writes in
+  flight, and later writes see the mark (get_write_shard_db); we then wait
+  out the directory cache so reads have seen it too before copying and
+  deleting. Archived trees move with their root rows.
+  Outbox events stay behind (change feed offsets are per shard), so feed
+  consumers resuming with an offset from the source shard get a reset event.
+  """
+  primary = SessionLocal()
+  try:
+      user = primary.query(User).filter(User.id == user_id).with_for_update().first()
+      if user is None:
+          raise ValueError(f"User {user_id} not found")
+      assignment = primary.get(ShardAssignment, user_id)
+      source = assignment.shard if assignment and assignment.shard is not None else router.ring_shard(user_id)
+      if source == target:
+          return 0
+
+      _assign(primary, user_id, source, "moving")
+      time.sleep(router.directory_ttl)
+
+      source_db = router.sessionmakers[source]()
+      target_db = router.sessionmakers[target]()
+      try:
+          levels = _levels(source_db.query(Transaction).filter(Transaction.user_id == user_id).all())
+          moved = sum(len(level) for level in levels)
+          try:
+              router.ensure_user(target, target_db, user)
+              for level in levels:
+                  for start in range(0, len(level), batch_size):
+                      target_db.add_all([
+                          Transaction(
+                              transaction_id=row.transaction_id,
+                              amount=row.amount,
+                              type=row.type,
+                              parent_id=row.parent_id,
+                              created_at=row.created_at,
+                              updated_at=row.updated_at,
+                              user_id=row.user_id
+                          )
+                          for row in level[start:start + batch_size]
+                      ])
+                      target_db.flush()
+              # Archived trees hang off their root rows, so they move with them
+              trees = source_db.query(ArchivedTree).filter(ArchivedTree.user_id == user_id).all()
+              root_ids = [tree.root_id for tree in trees]
+              target_db.add_all([
+                  ArchivedTree(
+                      root_id=tree.root_id,
+                      user_id=tree.user_id,
+                      subtree_sum=tree.subtree_sum,
+                      row_count=tree.row_count,
+                      type_breakdown=tree.type_breakdown,
+                      first_created_at=tree.first_created_at,
+                      last_created_at=tree.last_created_at,
+                      archived_at=tree.archived_at,
+                      payload=tree.payload
+                  )
+                  for tree in trees
+              ])
+              target_db.flush()
+              for start in range(0, len(root_ids), batch_size):
+                  target_db.add_all([
+                      ArchivedTransaction(transaction_id=row.transaction_id, root_id=row.root_id, type=row.type)
+                      for row in source_db.query(ArchivedTransaction).filter(
+                          ArchivedTransaction.root_id.in_(root_ids[start:start + batch_size])
+                      )
+                  ])
+                  target_db.flush()
+              target_db.commit()
+          except Exception:
+              target_db.rollback()
+              _assign(primary, user_id, source, "active")
+              raise
+
+          # Switch the user over, then drop the now unreachable source copy
+          _assign(primary, user_id, target, "active")
+          router._directory.pop(user_id, None)
+          for start in range(0, len(root_ids), batch_size):
+              batch = root_ids[start:start + batch_size]
+              source_db.query(ArchivedTransaction).filter(
+                  ArchivedTransaction.root_id.in_(batch)
+              ).delete(synchronize_session=False)
+              source_db.query(ArchivedTree).filter(
+                  ArchivedTree.root_id.in_(batch)
+              ).delete(synchronize_session=False)
+          for level in reversed(levels):
+              ids = [row.transaction_id for row in level]
+              for start in range(0, len(ids), batch_size):
+                  source_db.query(Transaction).filter(
+                      Transaction.transaction_id.in_(ids[start:start + batch_size])
+                  ).delete(synchronize_session=False)
+          source_db.commit()
+      finally:
+          source_db.close()
+          target_db.close()
+
+      logger.info(f"Moved {moved} transactions of user {user_id} from shard {source} to {target}")
+      return moved
+  finally:
+      primary.close()
+
+def pin_users(old_shard_count: int, router: ShardRouter = shard_router) -> int:
+  """
+  Before adding shards: record every user's placement under the old ring in
+  the directory, so growing the ring does not re-route anyone whose rows have
+  not moved yet. Users that already have an entry are left alone.
+  """
+  primary = SessionLocal()
+  try:
+      pinned_ids = {row.user_id for row in primary.query(ShardAssignment.user_id)}
+      pinned = 0
+      for (user_id,) in primary.query(User.id):
+          if user_id in pinned_ids:
+              continue
+          shard = router.ring_shard(user_id, old_shard_count)
+          primary.add(ShardAssignment(user_id=user_id, shard=shard, status="active"))
+          pinned += 1
+      primary.commit()
+      return pinned
+  finally:
+      primary.close()
+
+def rebalance(router: ShardRouter = shard_router, limit: int | None = None) -> int:
+  """Move pinned users whose ring placement differs; returns users moved"""
+  primary = SessionLocal()
+  try:
+      assignments = primary.query(ShardAssignment).filter(
+          ShardAssignment.status == "active",
+          ShardAssignment.shard.isnot(None)
+      ).all()
+      pending = [
+          (assignment.user_id, router.ring_shard(assignment.user_id))
+          for assignment in assignments
+          if assignment.shard != router.ring_shard(assignment.user_id)
+      ][:limit]
+  finally:
+      primary.close()
+
+  for user_id, target in pending:
+      move_user(user_id, target, router)
+  return len(pending)
+
+def main(argv: list[str] | None = None) -> None:
+  """Shard maintenance: `python -m app.core.sharding {pin,rebalance,move,where} ...`"""
+  parser = argparse.ArgumentParser(prog="python -m app.core.sharding")
+  commands = parser.add_subparsers(dest="command", required=True)
+  pin = commands.add_parser("pin", help="pin users to their placement under the old ring")
+  pin.add_argument("old_shard_count", type=int)
+  balance = commands.add_parser("rebalance", help="move pinned users to their ring placement")
+  balance.add_argument("--limit", type=int, default=None)
+  move = commands.add_parser("move", help="move one user's rows to a shard")
+  move.add_argument("user_id", type=int)
+  move.add_argument("shard", type=int)
+  where = commands.add_parser("where", help="show the shard serving a user")
+  where.add_argument("user_id", type=int)
+  args = parser.parse_args(argv)
+
+  if args.command == "pin":
+      print(f"Pinned {pin_users(args.old_shard_count)} users")
+  elif args.command == "rebalance":
+      print(f"Moved {rebalance(limit=args.limit)} users")
+  elif args.command == "move":
+      print(f"Moved {move_user(args.user_id, args.shard)} transactions")
+  else:
+      db = SessionLocal()
+      try:
+          print(shard_router.shard_for(args.user_id, db))
+      finally:
+          db.close()
+
+if __name__ == "__main__":
+  main()
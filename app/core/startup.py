@@ -0,0 +1,108 @@
+# app/core/startup.py
+import asyncio
+import time
+from datetime import timedelta
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from fastapi_cache import FastAPICache
+from loguru import logger
+from sqlalchemy import func, text
+from sqlalchemy.pool import QueuePool
+from app.core.auth import create_access_token
+from app.core.config import settings
+from app.core.sharding import shard_router
+from app.models.transaction import Transaction, User
+
+# Startup measurements in seconds: import duration, time to ready (from the
+# start of app.main's import) and background cache warm-up duration
+timings: dict[str, float] = {}
+state = {"ready": False, "warmup": None}
+
+def _open_db_connections(bind, count: int) -> int:
+  """Check out `count` connections at once so the pool holds them afterwards"""
+  connections = []
+  try:
+      for _ in range(count):
+          connection = bind.connect()
+          connections.append(connection)
+          connection.execute(text("SELECT 1"))
+  finally:
+      for connection in connections:
+          connection.close()
+  return len(connections)
+
+async def warm_pools() -> None:
+  """Pre-open DB and Redis connections; failures are logged, not fatal"""
+  for shard, bind in enumerate(shard_router.engines):
+      count = settings.STARTUP_DB_CONNECTIONS
+      if isinstance(bind.pool, QueuePool):
+          count = min(count, bind.pool.size())
+      try:
+          opened = await run_in_threadpool(_open_db_connections, bind, count)
+          logger.info(f"Pre-opened {opened} connections to database shard {shard}")
+      except Exception as e:
+          logger.warning(f"Could not pre-open connections to database shard {shard}: {str(e)}")
+
+  try:
+      redis = FastAPICache.get_backend().redis
+      await asyncio.gather(*(redis.ping() for _ in range(settings.STARTUP_REDIS_CONNECTIONS)))
+      logger.info(f"Pre-opened {settings.STARTUP_REDIS_CONNECTIONS} Redis connections")
+  except Exception as e:
+      logger.warning(f"Could not pre-open Redis connections: {str(e)}")
+
+def _hot_paths() -> list[tuple[str, list[str]]]:
+  """(email, paths) for the users with the most transactions, across shards"""
+  sessions = [factory() for factory in shard_router.sessionmakers]
+  try:
+      candidates = []
+      for db in sessions:
+          candidates += [
+              (row.count, row.id, row.email, db)
+              for row in db.query(
+                  User.id, User.email, func.count(Transaction.transaction_id).label("count")
+              ).join(
+                  Transaction, Transaction.user_id == User.id
+              ).group_by(User.id, User.email).order_by(
+                  func.count(Transaction.transaction_id).desc()
+              ).limit(settings.CACHE_WARMUP_USERS).all()
+          ]
+      candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+
+      hot_paths = []
+      for _, user_id, email, db in candidates[:settings.CACHE_WARMUP_USERS]:
+          roots = db.query(Transaction.transaction_id).filter(
+              Transaction.user_id == user_id,
+              Transaction.parent_id.is_(None)
+          ).order_by(Transaction.created_at.desc()).limit(settings.CACHE_WARMUP_ROOTS).all()
+          types = db.query(Transaction.type).filter(
+              Transaction.user_id == user_id
+          ).distinct().all()
+          paths = [f"/transactionservice/sum/{root.transaction_id}" for root in roots]
+          paths += [f"/transactionservice/types/{row.type}" for row in types]
+          hot_paths.append((email, paths))
+      return hot_paths
+  finally:
+      for db in sessions:
+          db.close()
+
+async def warm_caches(app) -> None:
+  """
+  Replay the hottest users' sum and type reads through the app itself, so
+  the cache is filled under exactly the keys (and ETags) real requests use.
+  """
+  started = time.perf_counter()
+  warmed = 0
+  try:
+      hot_paths = await run_in_threadpool(_hot_paths)
+      transport = httpx.ASGITransport(app=app)
+      async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+          for email, paths in hot_paths:
+              token = create_access_token(data={"sub": email}, expires_delta=timedelta(minutes=1))
+              headers = {"Authorization": f"Bearer {token}"}
+              for path in paths:
+                  response = await client.get(path, headers=headers)
+                  warmed += response.status_code == 200
+  except Exception as e:
+      logger.warning(f"Cache warm-up stopped early: {str(e)}")
+  timings["warmup_s"] = round(time.perf_counter() - started, 3)
+  logger.info(f"Warmed {warmed} cache entries in {timings['warmup_s']}s")
@@ -0,0 +1,138 @@
+# app/core/tracing.py
+import json
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from loguru import logger
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core.config import settings
+
+class Span:
+  __slots__ = ("name", "attributes", "children", "start", "end")
+
+  def __init__(self, name: str, attributes: dict | None = None):
+      self.name = name
+      self.attributes = attributes or {}
+      self.children: list["Span"] = []
+      self.start = time.perf_counter()
+      self.end: float | None = None
+
+  def set(self, **attributes) -> None:
+      self.attributes.update(attributes)
+
+  def finish(self) -> None:
+      self.end = time.perf_counter()
+
+  @property
+  def duration_ms(self) -> float:
+      return ((self.end or time.perf_counter()) - self.start) * 1000
+
+  def to_dict(self) -> dict:
+      return {
+          "name": self.name,
+          "duration_ms": round(self.duration_ms, 3),
+          "attributes": self.attributes,
+          "children": [child.to_dict() for child in self.children],
+      }
+
+class _NoopSpan:
+  def set(self, **attributes) -> None:
+      pass
+
+_NOOP = _NoopSpan()
+
+# The innermost open span of the current request, if it is being traced.
+# Context variables follow awaits, tasks and FastAPI's threadpool calls, so
+# spans opened inside dependencies nest under the request's root span.
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+@contextmanager
+def span(name: str, **attributes):
+  """Record a child span of the current one; a no-op outside sampled requests"""
+  parent = _current.get()
+  if parent is None:
+      yield _NOOP
+      return
+  child = Span(name, attributes)
+  parent.children.append(child)
+  token = _current.set(child)
+  try:
+      yield child
+  finally:
+      child.finish()
+      _current.reset(token)
+
+class TraceBuffer:
+  """Most recent finished traces, in memory, optionally appended to a JSONL file"""
+
+  def __init__(self, size: int, export_path: str | None = None):
+      self.traces: deque[dict] = deque(maxlen=size)
+      self.export_path = export_path
+
+  def record(self, root: Span) -> None:
+      trace = root.to_dict()
+      trace["finished_at"] = time.time()
+      self.traces.append(trace)
+      if self.export_path:
+          try:
+              with open(self.export_path, "a") as export:
+                  export.write(json.dumps(trace) + "\n")
+          except OSError as e:
+              logger.warning(f"Could not export trace: {str(e)}")
+
+  def slowest(self, limit: int) -> list[dict]:
+      return sorted(self.traces, key=lambda trace: trace["duration_ms"], reverse=True)[:limit]
+
+trace_buffer = TraceBuffer(settings.TRACE_BUFFER_SIZE, settings.TRACE_EXPORT_PATH)
+
+class TracingMiddleware:
+  """
+  Pure ASGI middleware that opens a root span for a sampled fraction
+  (TRACE_SAMPLE_RATE) of HTTP requests. Unsampled requests only pay for one
+  random() call, and every span() below them is a no-op.
+  """
+
+  def __init__(self, app):
+      self.app = app
+
+  async def __call__(self, scope, receive, send):
+      if scope["type"] != "http" or random.random() >= settings.TRACE_SAMPLE_RATE:
+          await self.app(scope, receive, send)
+          return
+
+      root = Span(f"{scope['method']} {scope['path']}")
+
+      async def traced_send(message):
+          if message["type"] == "http.response.start":
+              root.set(status_code=message["status"])
+          await send(message)
+
+      token = _current.set(root)
+      try:
+          await self.app(scope, receive, traced_send)
+      finally:
+          _current.reset(token)
+          root.finish()
+          route = scope.get("route")
+          if route is not None:
+              root.set(route=getattr(route, "path", None))
+          trace_buffer.record(root)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  parent = _current.get()
+  if parent is not None and context is not None:
+      query_span = Span("db.query", {"statement": " ".join(statement.split())[:120]})
+      parent.children.append(query_span)
+      context._trace_span = query_span
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  query_span = getattr(context, "_trace_span", None)
+  if query_span is not None:
+      query_span.finish()
+      if cursor.rowcount >= 0:
+          query_span.set(rowcount=cursor.rowcount)
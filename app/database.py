@@ -1,16 +1,41 @@
 # app/database.py
 from sqlalchemy import create_engine, Index
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.functions import now
 from app.core.config import settings
 
 engine = create_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+@compiles(now, "sqlite")
+def _sqlite_now(element, compiler, **kw):
+  """
+  SQLite keeps timestamps as text and compares them as text. CURRENT_TIMESTAMP
+  has no fractional seconds while bound datetimes are written with six digits,
+  so server defaults would not compare equal to a cursor for the same instant.
+  """
+  return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
 def get_db():
   db = SessionLocal()
   try:
       yield db
   finally:
-      db.close()
\ No newline at end of file
+      db.close()
+
+def pool_status(bind=None) -> dict:
+  """Checked-out connections against pool capacity (size + max overflow)"""
+  pool = (bind or engine).pool
+  if not isinstance(pool, QueuePool):
+      return {"checked_out": 0, "capacity": None, "saturation": 0.0}
+  capacity = pool.size() + max(pool._max_overflow, 0)
+  checked_out = pool.checkedout()
+  return {
+      "checked_out": checked_out,
+      "capacity": capacity,
+      "saturation": round(checked_out / capacity, 2) if capacity else 0.0,
+  }
@@ -1,11 +1,24 @@
 # app/main.py
-from fastapi import FastAPI
+import time
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+from fastapi import FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.endpoints import transaction
+from app.api.endpoints import transaction, changes, jobs, traces
 from app.core import auth
 from app.core.config import settings
-from app.core.cache import setup_cache
+from app.core.admission import admission_stats
+from app.core.cache import setup_cache, cache_available, cache_stats
+from app.database import pool_status
 from app.core.logging import setup_logging
+from app.core import startup
+from app.core.outbox import change_feeds
+from app.core.sharding import shard_router
+from app.core.tracing import TracingMiddleware
+from loguru import logger
+
+startup.timings["import_s"] = round(time.perf_counter() - IMPORT_STARTED, 3)
 
 app = FastAPI(
   title=settings.PROJECT_NAME,
@@ -20,11 +33,33 @@ app.add_middleware(
   allow_methods=["*"],
   allow_headers=["*"],
 )
+app.add_middleware(TracingMiddleware)
 
 @app.on_event("startup")
 async def startup_event():
   setup_logging()
   await setup_cache()
+  await startup.warm_pools()
+  startup.state["ready"] = True
+  startup.timings["ready_s"] = round(time.perf_counter() - IMPORT_STARTED, 3)
+  logger.info(
+      f"Startup: imports {startup.timings['import_s']}s, "
+      f"ready after {startup.timings['ready_s']}s"
+  )
+  if settings.CACHE_WARMUP_USERS > 0:
+      startup.state["warmup"] = asyncio.create_task(startup.warm_caches(app))
+  for feed in change_feeds:
+      feed.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+  startup.state["ready"] = False
+  warmup = startup.state["warmup"]
+  if warmup is not None and not warmup.done():
+      warmup.cancel()
+  for feed in change_feeds:
+      await feed.stop()
+  shard_router.dispose()
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
 app.include_router(
@@ -32,7 +67,42 @@ app.include_router(
   prefix="/transactionservice",
   tags=["transactions"]
 )
+app.include_router(
+  changes.router,
+  prefix="/transactionservice",
+  tags=["changes"]
+)
+app.include_router(
+  jobs.router,
+  prefix="/transactionservice",
+  tags=["jobs"]
+)
+app.include_router(traces.router, prefix="/debug", tags=["debug"])
 
 @app.get("/health")
 async def health_check():
-  return {"status": "healthy"}
\ No newline at end of file
+  return {"status": "healthy"}
+
+@app.get("/ready")
+async def readiness_check(response: Response):
+  """Not ready before startup, or while the DB pool is saturated or Redis is unreachable"""
+  database = pool_status()
+  if shard_router.sharded:
+      database["shards"] = [pool_status(shard_engine) for shard_engine in shard_router.engines]
+      database["saturation"] = max(shard["saturation"] for shard in [database, *database["shards"]])
+  redis_ok = await cache_available()
+  ready = (
+      startup.state["ready"]
+      and redis_ok
+      and database["saturation"] < settings.READINESS_POOL_SATURATION
+  )
+  if not ready:
+      response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+  return {
+      "status": "ready" if ready else "unavailable",
+      "database": database,
+      "redis": "ok" if redis_ok else "unavailable",
+      "admission": admission_stats(),
+      "cache": cache_stats(),
+      "startup": startup.timings,
+  }
@@ -1,5 +1,6 @@
 # app/models/transaction.py
-from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Index, Boolean, BigInteger
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Index, Boolean, BigInteger, JSON, LargeBinary
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -19,6 +20,10 @@ class Transaction(Base):
       Index('idx_transaction_type', 'type'),
       Index('idx_transaction_parent_id', 'parent_id'),
       Index('idx_transaction_user_id', 'user_id'),
+      # Keyset pagination by time: (user_id, created_at, transaction_id)
+      Index('idx_transaction_user_created', 'user_id', 'created_at', 'transaction_id'),
+      # created_at is append-mostly, so a BRIN index stays tiny
+      Index('idx_transaction_created_at_brin', 'created_at', postgresql_using='brin'),
   )
 
 class User(Base):
@@ -27,4 +32,113 @@ class User(Base):
   id = Column(Integer, primary_key=True)
   email = Column(String, unique=True, index=True, nullable=False)
   hashed_password = Column(String, nullable=False)
-  is_active = Column(Boolean, default=True)
\ No newline at end of file
+  is_active = Column(Boolean, default=True)
+
+class OutboxEvent(Base):
+  """
+  Change events written in the same commit as the change itself.
+  `id` is the feed offset consumers resume from.
+  """
+  __tablename__ = "outbox_events"
+
+  # SQLite only autoincrements INTEGER primary keys
+  id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+  user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+  event_type = Column(String, nullable=False)
+  transaction_id = Column(BigInteger, nullable=False)
+  payload = Column(JSON, nullable=False)
+  created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+  __table_args__ = (
+      Index('idx_outbox_user_id_id', 'user_id', 'id'),
+      Index('idx_outbox_created_at', 'created_at'),
+  )
+
+class ShardAssignment(Base):
+  """Directory overrides of the shard ring, kept on the primary database"""
+  __tablename__ = "shard_directory"
+
+  user_id = Column(Integer, primary_key=True)
+  shard = Column(Integer, nullable=True)
+  status = Column(String, nullable=False, default="active")
+
+class TransactionClaim(Base):
+  """
+  Owner of every transaction id, on the primary database. Ids are global:
+  shards only enforce uniqueness among their own rows, so a write claims
+  its id here too (see app.core.sharding.claim_transaction_id).
+  """
+  __tablename__ = "transaction_ids"
+
+  transaction_id = Column(BigInteger, primary_key=True)
+  user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+class ArchivedTree(Base):
+  """
+  Summary of a settled tree whose descendants were moved out of
+  `transactions`; the root row itself stays there. `payload` holds the
+  descendants column by column, compressed (see app.core.archive), and is
+  only loaded when an archived row is read.
+  """
+  __tablename__ = "archived_trees"
+
+  root_id = Column(BigInteger, ForeignKey("transactions.transaction_id"), primary_key=True)
+  user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+  # Over the whole tree, root included
+  subtree_sum = Column(Float, nullable=False)
+  row_count = Column(Integer, nullable=False)
+  type_breakdown = Column(JSON, nullable=False)
+  # created_at range of the descendants, so listings unpack only the trees
+  # that overlap their window (NULL for trees archived before these existed)
+  first_created_at = Column(DateTime(timezone=True), nullable=True)
+  last_created_at = Column(DateTime(timezone=True), nullable=True)
+  archived_at = Column(DateTime(timezone=True), server_default=func.now())
+  payload = deferred(Column(LargeBinary, nullable=False))
+
+  __table_args__ = (
+      Index('idx_archived_tree_user_id', 'user_id'),
+  )
+
+class ArchivedTransaction(Base):
+  """Which archived tree an archived transaction id lives in, and its type"""
+  __tablename__ = "archived_transactions"
+
+  transaction_id = Column(BigInteger, primary_key=True)
+  root_id = Column(BigInteger, ForeignKey("archived_trees.root_id"), nullable=False)
+  type = Column(String, nullable=False)
+
+  __table_args__ = (
+      Index('idx_archived_transaction_root_id', 'root_id'),
+      Index('idx_archived_transaction_type', 'type', 'root_id'),
+  )
+
+class Job(Base):
+  """
+  Background job run by `python -m app.core.jobs worker`, on the primary.
+  `cursor` is the checkpoint of the last committed chunk; a worker that
+  reclaims the job after a crash resumes from there.
+  """
+  __tablename__ = "jobs"
+
+  id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+  kind = Column(String, nullable=False)
+  user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+  params = Column(JSON, nullable=False, default=dict)
+  # queued / running / cancelling / cancelled / succeeded / failed
+  status = Column(String, nullable=False, default="queued")
+  cursor = Column(JSON, nullable=True)
+  progress = Column(Integer, nullable=False, default=0)
+  total = Column(Integer, nullable=True)
+  result = Column(JSON, nullable=True)
+  error = Column(String, nullable=True)
+  attempts = Column(Integer, nullable=False, default=0)
+  worker = Column(String, nullable=True)
+  heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+  created_at = Column(DateTime(timezone=True), server_default=func.now())
+  started_at = Column(DateTime(timezone=True), nullable=True)
+  finished_at = Column(DateTime(timezone=True), nullable=True)
+
+  __table_args__ = (
+      Index('idx_job_status_id', 'status', 'id'),
+      Index('idx_job_user_id_id', 'user_id', 'id'),
+  )
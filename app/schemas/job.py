@@ -0,0 +1,38 @@
+# app/schemas/job.py
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+
+class NoParams(BaseModel):
+  """Job params are validated per kind at submit time; unknown keys are rejected"""
+
+  class Config:
+      extra = "forbid"
+
+class ArchiveParams(NoParams):
+  # Defaults to ARCHIVE_SETTLED_DAYS
+  older_than_days: Optional[int] = Field(None, ge=1)
+
+class JobCreate(BaseModel):
+  kind: str = Field(..., min_length=1, max_length=50)
+  params: Dict[str, Any] = {}
+
+class JobResponse(BaseModel):
+  id: int
+  kind: str
+  status: str
+  params: Dict[str, Any]
+  progress: int
+  total: Optional[int] = None
+  result: Optional[Dict[str, Any]] = None
+  error: Optional[str] = None
+  attempts: int
+  created_at: Optional[datetime] = None
+  started_at: Optional[datetime] = None
+  finished_at: Optional[datetime] = None
+
+  class Config:
+      from_attributes = True
+
+class JobList(BaseModel):
+  items: List[JobResponse]
@@ -25,7 +25,7 @@ class TransactionResponse(TransactionBase):
   user_id: int
 
   class Config:
-      orm_mode = True
+      from_attributes = True
 
 class StatusResponse(BaseModel):
   status: str
@@ -34,4 +34,8 @@ class SumResponse(BaseModel):
   sum: float
 
 class TransactionTypeResponse(BaseModel):
-  transaction_ids: List[int]
\ No newline at end of file
+  transaction_ids: List[int]
+
+class TransactionPage(BaseModel):
+  items: List[TransactionResponse]
+  next_cursor: Optional[str] = None
@@ -0,0 +1,28 @@
+# app/server.py
+import importlib.util
+import uvicorn
+from loguru import logger
+from app.core.config import settings
+
+def _available(module: str) -> bool:
+  return importlib.util.find_spec(module) is not None
+
+def main():
+  """Production entry point: `python -m app.server`"""
+  loop = "uvloop" if _available("uvloop") else "asyncio"
+  http = "httptools" if _available("httptools") else "h11"
+  logger.info(f"Starting {settings.WEB_CONCURRENCY} worker(s) with loop={loop}, http={http}")
+  uvicorn.run(
+      "app.main:app",
+      host=settings.SERVER_HOST,
+      port=settings.SERVER_PORT,
+      workers=settings.WEB_CONCURRENCY,
+      loop=loop,
+      http=http,
+      proxy_headers=True,
+      # Stop accepting, then let in-flight requests finish before exiting
+      timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_SECONDS,
+  )
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,106 @@
+# tests/test_admission.py
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from redis import asyncio as aioredis
+
+from app.main import app
+from app.core.admission import AdaptiveLimiter, Overloaded
+
+def make_limiter(**overrides) -> AdaptiveLimiter:
+  options = dict(
+      name="test", priority=0, max_wait=0.05, latency_target=0.1,
+      min_limit=1, max_limit=2,
+  )
+  options.update(overrides)
+  return AdaptiveLimiter(**options)
+
+def test_sheds_after_queue_timeout():
+  async def scenario():
+      limiter = make_limiter()
+      await limiter.acquire()
+      await limiter.acquire()
+      with pytest.raises(Overloaded):
+          await limiter.acquire()
+      assert limiter.shed == 1
+      assert limiter.queued == 0
+      assert limiter.retry_after() >= 1
+
+  asyncio.run(scenario())
+
+def test_release_hands_slot_to_waiter():
+  async def scenario():
+      limiter = make_limiter(max_wait=1.0, max_limit=1)
+      await limiter.acquire()
+      waiting = asyncio.create_task(limiter.acquire())
+      await asyncio.sleep(0)
+      assert limiter.queued == 1
+      limiter.release(0.01)
+      await waiting
+      assert limiter.in_flight == 1
+      limiter.release(0.01)
+      assert limiter.in_flight == 0
+
+  asyncio.run(scenario())
+
+def test_shrinking_limit_retires_slots_while_waiters_queue():
+  async def scenario():
+      limiter = make_limiter(max_wait=5.0, max_limit=4, backoff=0.5)
+      for _ in range(4):
+          await limiter.acquire()
+      waiting = [asyncio.create_task(limiter.acquire()) for _ in range(4)]
+      await asyncio.sleep(0)
+      assert limiter.queued == 4
+
+      # Slow releases halve the limit: 4 -> 2 -> 1, so slots are not handed over
+      limiter.release(1.0)
+      limiter.release(1.0)
+      assert (limiter.limit, limiter.in_flight, limiter.queued) == (1, 2, 4)
+      limiter.release(1.0)
+      assert (limiter.in_flight, limiter.queued) == (1, 4)
+      # Back within the limit, the next release hands its slot to a waiter
+      limiter.release(0.01)
+      await asyncio.sleep(0)
+      assert (limiter.in_flight, limiter.queued) == (1, 3)
+      for task in waiting:
+          task.cancel()
+
+  asyncio.run(scenario())
+
+def test_limit_adapts_to_latency():
+  limiter = make_limiter(max_limit=10, backoff=0.5)
+  limiter.in_flight = 1
+  limiter.release(1.0)
+  assert limiter.limit == 5
+  limiter.in_flight = 1
+  limiter.release(0.01)
+  assert limiter.limit == pytest.approx(5.2)
+
+def test_lower_priority_shed_while_higher_queues():
+  async def scenario():
+      point = make_limiter(name="point", priority=2, max_wait=1.0, max_limit=1)
+      tree = make_limiter(name="tree", priority=0, max_wait=1.0, max_limit=1)
+      await point.acquire()
+      await tree.acquire()
+      queued_point = asyncio.create_task(point.acquire())
+      await asyncio.sleep(0)
+      with pytest.raises(Overloaded):
+          await tree.acquire([point])
+      point.release(0.01)
+      await queued_point
+
+  asyncio.run(scenario())
+
+def test_ready_reports_unavailable_redis():
+  # Nothing listens on port 1, whatever Redis the environment provides
+  FastAPICache.reset()
+  FastAPICache.init(RedisBackend(aioredis.from_url("redis://127.0.0.1:1", socket_connect_timeout=0.2)))
+  try:
+      response = TestClient(app).get("/ready")
+  finally:
+      FastAPICache.reset()
+  assert response.status_code == 503
+  assert response.json()["redis"] == "unavailable"
+  assert set(response.json()["admission"]) == {"point", "write", "tree"}
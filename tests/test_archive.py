@@ -0,0 +1,109 @@
+# tests/test_archive.py
+from datetime import datetime, timedelta, timezone
+import pytest
+
+from app.core import archive, jobs
+from app.core.archive import archive_tree, benchmark, restore_tree
+from app.core.jobs import JobRunner, submit_job
+from app.models.transaction import ArchivedTree, Transaction
+
+@pytest.fixture(scope="function")
+def trees(db, monkeypatch):
+  monkeypatch.setattr(jobs.settings, "JOB_DUTY_CYCLE", 1.0)
+  old = datetime.now(timezone.utc) - timedelta(days=365)
+  db.add_all([
+      Transaction(transaction_id=transaction_id, amount=amount, type=kind, parent_id=parent_id, user_id=1, created_at=old)
+      for transaction_id, amount, kind, parent_id in (
+          (1, 10, "cars", None), (2, 5, "cars", 1), (3, 2, "food", 2), (4, 1, "food", 1), (5, 3, "cars", None)
+      )
+  ])
+  # A recent tree is not settled
+  db.add_all([
+      Transaction(transaction_id=6, amount=1, type="cars", user_id=1),
+      Transaction(transaction_id=7, amount=1, type="cars", parent_id=6, user_id=1),
+  ])
+  db.commit()
+
+def archive_settled(db, session_factory):
+  job = submit_job(db, 1, "archive_settled_trees")
+  runner = JobRunner(session_factory, name="test", pressure=lambda: False)
+  runner.claim()
+  assert runner.run(job.id) == "succeeded"
+  db.refresh(job)
+  return job
+
+def test_archive_keeps_summary_and_reads_stay_transparent(db, trees, api, session_factory):
+  job = archive_settled(db, session_factory)
+  assert job.result == {"trees_archived": 1, "rows_archived": 3}
+  assert (job.progress, job.total) == (2, 2)
+  assert sorted(row.transaction_id for row in db.query(Transaction.transaction_id)) == [1, 5, 6, 7]
+
+  summary = db.get(ArchivedTree, 1)
+  assert (summary.subtree_sum, summary.row_count) == (18, 4)
+  assert summary.type_breakdown == {"cars": {"count": 2, "sum": 15}, "food": {"count": 2, "sum": 3}}
+
+  assert api.get("/transactionservice/sum/1").json() == {"sum": 18}
+  assert api.get("/transactionservice/sum/2").json() == {"sum": 7}
+  archived = api.get("/transactionservice/transaction/3")
+  assert archived.status_code == 200
+  assert (archived.json()["amount"], archived.json()["parent_id"]) == (2, 2)
+  assert archived.headers["ETag"]
+  assert api.get("/transactionservice/transaction/99").status_code == 404
+
+  # Archived trees are read-only and their ids stay taken
+  assert api.put("/transactionservice/transaction/8", json={"amount": 1, "type": "a", "parent_id": 2}).status_code == 409
+  assert api.put("/transactionservice/transaction/8", json={"amount": 1, "type": "a", "parent_id": 1}).status_code == 409
+  assert api.put("/transactionservice/transaction/3", json={"amount": 1, "type": "a"}).status_code == 400
+
+def test_types_and_listings_include_archived_rows(db, trees, api, session_factory, monkeypatch):
+  archive_settled(db, session_factory)
+  with monkeypatch.context() as patched:
+      # /types reads the id index, never the packed trees
+      patched.setattr(archive, "_unpack", lambda payload: pytest.fail("unpacked a tree"))
+      assert sorted(api.get("/transactionservice/types/cars").json()) == [1, 2, 5, 6, 7]
+      assert sorted(api.get("/transactionservice/types/food").json()) == [3, 4]
+
+  ids, cursor = [], None
+  while True:
+      page = api.get("/transactionservice/transactions", params={"limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+      ids += [item["transaction_id"] for item in page["items"]]
+      cursor = page["next_cursor"]
+      if cursor is None:
+          break
+  assert ids == [1, 2, 3, 4, 5, 6, 7]
+
+  def listed(**params):
+      return [item["transaction_id"] for item in api.get("/transactionservice/transactions", params=params).json()["items"]]
+  assert listed(type="food") == [3, 4]
+  assert listed(parent_id=1) == [2, 4]
+  assert listed(parent_id=2) == [3]
+  recent = datetime.now(timezone.utc) - timedelta(days=1)
+  assert listed(since=recent.isoformat()) == [6, 7]
+
+def test_tree_written_since_selection_is_not_archived(db, trees):
+  settled_before = datetime.now(timezone.utc) - timedelta(days=90)
+  # A child was added (touching the root) after settled_roots picked it
+  db.query(Transaction).filter(Transaction.transaction_id == 1).update(
+      {Transaction.updated_at: datetime.now(timezone.utc)}
+  )
+  db.commit()
+  assert archive_tree(db, 1, 1, settled_before) is None
+  assert archive_tree(db, 5, 1, settled_before) is None  # childless
+  db.commit()
+  assert db.query(ArchivedTree).count() == 0
+  assert db.query(Transaction).count() == 7
+
+def test_restore_puts_rows_back(db, trees, api, session_factory):
+  archive_settled(db, session_factory)
+  assert restore_tree(db, 1) == 3
+  db.commit()
+  assert db.get(ArchivedTree, 1) is None
+  assert db.query(Transaction).count() == 7
+
+  assert api.get("/transactionservice/sum/1", headers={"Cache-Control": "no-store"}).json() == {"sum": 18}
+
+def test_benchmark_shrinks_indexes(tmp_path):
+  report = benchmark(f"sqlite:///{tmp_path}/bench.db", trees=50, fanout=3, depth=2)
+  assert report["trees_archived"] == 50
+  assert (report["before"]["rows"], report["after"]["rows"]) == (650, 50)
+  assert report["after"]["index_bytes"] < report["before"]["index_bytes"]
@@ -0,0 +1,78 @@
+# tests/test_cache.py
+import asyncio
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from app.core import cache as cache_module
+from app.core.cache import cache, user_key_builder
+
+@pytest.fixture(autouse=True)
+def backend():
+  FastAPICache.reset()
+  backend = InMemoryBackend()
+  FastAPICache.init(backend, prefix="test", key_builder=user_key_builder)
+  cache_module.stats.clear()
+  yield backend
+  FastAPICache.reset()
+
+def test_concurrent_misses_are_coalesced():
+  calls = []
+  app = FastAPI()
+
+  @app.get("/slow/{item_id}")
+  @cache(expire=60)
+  async def slow(item_id: int):
+      calls.append(item_id)
+      await asyncio.sleep(0.05)
+      return {"item_id": item_id}
+
+  async def scenario():
+      transport = httpx.ASGITransport(app=app)
+      async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+          responses = await asyncio.gather(*(client.get("/slow/1") for _ in range(10)))
+      return responses
+
+  responses = asyncio.run(scenario())
+  assert all(response.json() == {"item_id": 1} for response in responses)
+  assert calls == [1]
+  assert cache_module.stats["coalesced_local"] == 9
+
+def test_stale_entry_is_served_then_refreshed(monkeypatch):
+  calls = []
+  app = FastAPI()
+
+  @app.get("/counter")
+  @cache(expire=60)
+  async def counter():
+      calls.append(1)
+      return {"calls": len(calls)}
+
+  client = TestClient(app)
+  response = client.get("/counter")
+  assert response.json() == {"calls": 1}
+  assert response.headers["X-FastAPI-Cache"] == "MISS"
+  assert client.get("/counter").headers["X-FastAPI-Cache"] == "HIT"
+
+  # Jump past the fresh window but stay inside the stale window
+  monkeypatch.setattr(cache_module, "_now", lambda: time.time() + 70)
+  response = client.get("/counter")
+  assert response.headers["X-FastAPI-Cache"] == "STALE"
+  assert response.json() == {"calls": 1}
+
+  # The refresh runs in the background on the client's event loop
+  deadline = time.monotonic() + 1
+  while not cache_module.stats["refreshed"] and time.monotonic() < deadline:
+      time.sleep(0.01)
+  assert len(calls) == 2
+  assert cache_module.stats["refreshed"] == 1
+
+def test_ttl_is_jittered(monkeypatch):
+  monkeypatch.setattr(cache_module.settings, "CACHE_TTL_JITTER", 0.1)
+  samples = {round(cache_module._jittered(300), 3) for _ in range(20)}
+  assert len(samples) > 1
+  assert all(270 <= sample <= 330 for sample in samples)
@@ -0,0 +1,43 @@
+# tests/test_etag.py
+from app.core.etag import etag_matches
+
+def test_etag_matches():
+  assert etag_matches('"s-1-2"', '"s-1-2"')
+  assert etag_matches('W/"s-1-2", "x"', '"s-1-2"')
+  assert etag_matches("*", '"s-1-2"')
+  assert not etag_matches('"s-1-3"', '"s-1-2"')
+  assert not etag_matches(None, '"s-1-2"')
+
+def test_transaction_not_modified(api):
+  api.put("/transactionservice/transaction/10", json={"amount": 5000, "type": "cars"})
+
+  response = api.get("/transactionservice/transaction/10")
+  assert response.status_code == 200
+  etag = response.headers["ETag"]
+  assert not etag.startswith("W/")
+
+  response = api.get("/transactionservice/transaction/10", headers={"If-None-Match": etag})
+  assert response.status_code == 304
+  assert response.headers["ETag"] == etag
+  assert response.content == b""
+
+def test_sum_etag_changes_with_subtree(api):
+  api.put("/transactionservice/transaction/10", json={"amount": 5000, "type": "cars"})
+  api.put("/transactionservice/transaction/11", json={"amount": 100, "type": "cars", "parent_id": 10})
+
+  response = api.get("/transactionservice/sum/10")
+  assert response.json() == {"sum": 5100}
+  etag = response.headers["ETag"]
+  assert api.get("/transactionservice/sum/10", headers={"If-None-Match": etag}).status_code == 304
+
+  # A grandchild touches every ancestor, so the root's sum ETag changes
+  api.put("/transactionservice/transaction/12", json={"amount": 10, "type": "cars", "parent_id": 11})
+  response = api.get("/transactionservice/sum/10", headers={"If-None-Match": etag})
+  assert response.status_code == 200
+  assert response.json() == {"sum": 5110}
+  assert response.headers["ETag"] != etag
+
+def test_missing_transaction_has_no_etag(api):
+  response = api.get("/transactionservice/transaction/999", headers={"If-None-Match": "*"})
+  assert response.status_code == 404
+  assert "ETag" not in response.headers
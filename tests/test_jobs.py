@@ -0,0 +1,119 @@
+# tests/test_jobs.py
+from datetime import datetime, timedelta
+import pytest
+
+from app.core import jobs
+from app.core.jobs import JobRunner, cancel_job, submit_job
+from app.models.transaction import Transaction, User
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+  monkeypatch.setattr(jobs.settings, "JOB_BATCH_SIZE", 2)
+  monkeypatch.setattr(jobs.settings, "JOB_DUTY_CYCLE", 1.0)
+
+@pytest.fixture(scope="function")
+def runner(db, session_factory):
+  db.add(User(id=2, email="other@example.com", hashed_password="x", is_active=True))
+  db.commit()
+  return JobRunner(session_factory, name="test", pressure=lambda: False)
+
+def add_transactions(db, *rows):
+  db.add_all([
+      Transaction(transaction_id=transaction_id, amount=1, type="cars", parent_id=parent_id, user_id=user_id)
+      for transaction_id, parent_id, user_id in rows
+  ])
+  db.commit()
+
+def test_submit_get_and_cancel_through_the_api(api):
+  assert api.post("/transactionservice/jobs", json={"kind": "nope"}).status_code == 400
+  # Params are checked per kind, and archival is not open to users
+  assert api.post("/transactionservice/jobs", json={"kind": "consistency_check", "params": {"x": 1}}).status_code == 400
+  assert api.post("/transactionservice/jobs", json={"kind": "archive_settled_trees"}).status_code == 400
+
+  response = api.post("/transactionservice/jobs", json={"kind": "consistency_check"})
+  assert response.status_code == 202
+  job_id = response.json()["id"]
+  assert api.get(f"/transactionservice/jobs/{job_id}").json()["status"] == "queued"
+
+  assert api.post(f"/transactionservice/jobs/{job_id}/cancel").json()["status"] == "cancelled"
+  assert api.post(f"/transactionservice/jobs/{job_id}/cancel").status_code == 409
+  assert [job["id"] for job in api.get("/transactionservice/jobs").json()["items"]] == [job_id]
+
+def test_params_are_validated_at_submit(db):
+  with pytest.raises(ValueError, match="older_than_days"):
+      submit_job(db, 1, "archive_settled_trees", {"older_than_days": 0})
+  with pytest.raises(ValueError, match="older_than_days"):
+      submit_job(db, 1, "archive_settled_trees", {"older_than_days": "soon"})
+  assert submit_job(db, 1, "archive_settled_trees", {"older_than_days": 180}).params == {"older_than_days": 180}
+
+def test_consistency_check_runs_in_chunks(db, runner):
+  add_transactions(db, (1, None, 1), (2, 1, 1), (3, None, 2), (4, 3, 1), (5, 2, 1))
+  job = submit_job(db, 1, "consistency_check")
+
+  assert runner.claim() == job.id
+  assert runner.run(job.id) == "succeeded"
+  db.refresh(job)
+  assert (job.progress, job.total) == (4, 4)
+  assert job.result == {"checked": 4, "orphans": [4]}
+  assert runner.claim() is None
+
+def test_crashed_job_resumes_from_its_checkpoint(db, runner, monkeypatch):
+  add_transactions(db, *[(i, None, 1) for i in range(1, 6)])
+  job = submit_job(db, 1, "consistency_check")
+  seen = []
+  chunk = jobs.kinds["consistency_check"].chunk
+
+  def crashing_chunk(shard_db, user_id, params, cursor, batch_size):
+      seen.append(cursor)
+      if len(seen) == 2:
+          raise KeyboardInterrupt  # the worker dies mid-chunk
+      return chunk(shard_db, user_id, params, cursor, batch_size)
+
+  monkeypatch.setattr(jobs.kinds["consistency_check"], "chunk", crashing_chunk)
+  runner.claim()
+  with pytest.raises(KeyboardInterrupt):
+      runner.run(job.id)
+
+  # Not reclaimable until its heartbeat is stale
+  assert runner.claim() is None
+  monkeypatch.setattr(jobs.settings, "JOB_HEARTBEAT_TIMEOUT_SECONDS", -1)
+  assert runner.claim() == job.id
+  assert runner.run(job.id) == "succeeded"
+  db.refresh(job)
+  assert seen[:3] == [None, {"after": 2}, {"after": 2}]
+  assert (job.progress, job.attempts, job.result["checked"]) == (5, 2, 5)
+
+def test_running_job_stops_when_cancelled(db, runner):
+  add_transactions(db, *[(i, None, 1) for i in range(1, 6)])
+  job = submit_job(db, 1, "consistency_check")
+  runner.claim()
+
+  def cancel_after_first_chunk() -> bool:
+      db.refresh(job)
+      if job.progress:
+          cancel_job(db, job)
+      return False
+
+  runner.pressure = cancel_after_first_chunk
+  assert runner.run(job.id) == "cancelled"
+  db.refresh(job)
+  # Cancelled during the second chunk, seen before the third
+  assert (job.progress, job.total) == (4, 5)
+
+def test_recompute_subtree_versions_repairs_stale_roots(db, runner):
+  old = datetime(2026, 1, 1)
+  db.add_all([
+      Transaction(transaction_id=1, amount=1, type="cars", user_id=1, created_at=old),
+      Transaction(transaction_id=2, amount=1, type="cars", parent_id=1, user_id=1, created_at=old),
+      Transaction(transaction_id=3, amount=1, type="cars", parent_id=2, user_id=1, created_at=old + timedelta(days=1)),
+  ])
+  db.commit()
+  job = submit_job(db, 1, "recompute_subtree_versions")
+  runner.claim()
+  assert runner.run(job.id) == "succeeded"
+
+  db.expire_all()
+  assert db.get(Transaction, 1).updated_at == old + timedelta(days=1)
+  assert db.get(Transaction, 2).updated_at == old + timedelta(days=1)
+  assert db.get(Transaction, 3).updated_at is None
+  assert job.result == {"roots": 1, "repaired": 2}
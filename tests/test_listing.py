@@ -0,0 +1,65 @@
+# tests/test_listing.py
+from datetime import datetime, timedelta
+import pytest
+
+from app.models.transaction import Transaction, User
+
+START = datetime(2024, 1, 1)
+
+@pytest.fixture(scope="function")
+def client(db, api):
+  db.add(User(id=2, email="other@example.com", hashed_password="x", is_active=True))
+  # Pairs of rows share a timestamp so pages must break ties on the id
+  for i in range(10):
+      db.add(Transaction(
+          transaction_id=i + 1,
+          amount=10,
+          type="cars" if i % 2 else "food",
+          parent_id=1 if i else None,
+          created_at=START + timedelta(minutes=i // 2),
+          user_id=1
+      ))
+  db.add(Transaction(transaction_id=100, amount=1, type="cars", created_at=START, user_id=2))
+  db.commit()
+  return api
+
+def fetch_all(client, **params):
+  ids, cursor, pages = [], None, 0
+  while True:
+      query = dict(params, **({"cursor": cursor} if cursor else {}))
+      response = client.get("/transactionservice/transactions", params=query)
+      assert response.status_code == 200
+      page = response.json()
+      ids += [item["transaction_id"] for item in page["items"]]
+      pages += 1
+      cursor = page["next_cursor"]
+      if cursor is None:
+          return ids, pages
+
+def test_pages_cover_range_in_order(client):
+  ids, pages = fetch_all(client, limit=3)
+  assert ids == list(range(1, 11))
+  assert pages == 4
+
+def test_time_range_and_filters(client):
+  ids, _ = fetch_all(
+      client,
+      since=(START + timedelta(minutes=1)).isoformat(),
+      until=(START + timedelta(minutes=4)).isoformat(),
+      limit=2
+  )
+  assert ids == [3, 4, 5, 6, 7, 8]
+
+  ids, _ = fetch_all(client, type="cars", parent_id=1, limit=2)
+  assert ids == [2, 4, 6, 8, 10]
+
+def test_invalid_cursor(client):
+  response = client.get("/transactionservice/transactions", params={"cursor": "bm9wZQ=="})
+  assert response.status_code == 400
+
+def test_pages_over_server_default_timestamps(db, api):
+  # Same-second rows stamped by the database, not by Python
+  db.add_all([Transaction(transaction_id=i, amount=1, type="cars", user_id=1) for i in range(1, 7)])
+  db.commit()
+  ids, _ = fetch_all(api, limit=2)
+  assert ids == list(range(1, 7))
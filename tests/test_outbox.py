@@ -0,0 +1,160 @@
+# tests/test_outbox.py
+import asyncio
+import pytest
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.api.endpoints import changes
+from app.api.endpoints.changes import get_changes
+from app.core import outbox
+from app.core.outbox import ChangeFeed, read_events, stream_changes
+from app.models.transaction import OutboxEvent, User
+
+def test_create_writes_outbox_event(db):
+  client = TestClient(app)
+  client.put("/transactionservice/transaction/10", json={"amount": 5000, "type": "cars"})
+  client.put("/transactionservice/transaction/11", json={"amount": 10, "type": "cars", "parent_id": 10})
+
+  events = read_events(db, after=0, limit=10)
+  assert [event["payload"]["transaction_id"] for event in events] == [10, 11]
+  assert events[1]["event_type"] == "transaction.created"
+  assert events[1]["payload"]["parent_id"] == 10
+  assert read_events(db, after=events[0]["id"], limit=10, user_id=2) == []
+
+def test_stream_backfills_then_follows(db, session_factory):
+  for transaction_id in (1, 2, 3):
+      db.add(OutboxEvent(
+          user_id=1, event_type="transaction.created",
+          transaction_id=transaction_id, payload={"transaction_id": transaction_id}
+      ))
+  db.commit()
+  feed = ChangeFeed(session_factory)
+  feed.last_id = 3
+
+  async def scenario():
+      stream = stream_changes(feed, user_id=1, after=1)
+      first = [await anext(stream), await anext(stream)]
+      feed.publish([
+          {"id": 3, "user_id": 1, "event_type": "transaction.created", "payload": {}},
+          {"id": 4, "user_id": 2, "event_type": "transaction.created", "payload": {}},
+          {"id": 5, "user_id": 1, "event_type": "transaction.created", "payload": {"transaction_id": 5}},
+      ])
+      followed = await anext(stream)
+      await stream.aclose()
+      return first, followed
+
+  first, followed = asyncio.run(scenario())
+  assert [chunk.split("\n")[0] for chunk in first] == ["id: 0:2", "id: 0:3"]
+  # id 3 was already backfilled and id 4 belongs to another user
+  assert followed.startswith("id: 0:5\nevent: transaction.created\n")
+  assert feed.subscriber_count == 0
+
+def test_relay_holds_back_at_gaps(monkeypatch, session_factory):
+  monkeypatch.setattr(outbox.settings, "OUTBOX_GAP_SETTLE_MS", 1000)
+  feed = ChangeFeed(session_factory)
+  events = [{"id": i} for i in (1, 2, 4)]
+  assert [e["id"] for e in feed.settled(events, now=0.0)] == [1, 2]
+  feed.last_id = 2
+  assert feed.settled(events[2:], now=0.5) == []
+  assert [e["id"] for e in feed.settled(events[2:], now=1.5)] == [4]
+
+def test_slow_subscriber_is_dropped(monkeypatch, session_factory):
+  monkeypatch.setattr(outbox.settings, "CHANGE_FEED_QUEUE_SIZE", 1)
+
+  async def scenario():
+      feed = ChangeFeed(session_factory)
+      queue = feed.subscribe(1)
+      feed.publish([{"id": i, "user_id": 1} for i in (1, 2)])
+      return feed, await queue.get()
+
+  feed, sentinel = asyncio.run(scenario())
+  assert sentinel is None
+  assert feed.subscriber_count == 0
+
+def test_relay_recovers_slow_commits(monkeypatch, session_factory):
+  monkeypatch.setattr(outbox.settings, "OUTBOX_GAP_SETTLE_MS", 1000)
+  monkeypatch.setattr(outbox.settings, "OUTBOX_GAP_RECHECK_SECONDS", 10)
+  feed = ChangeFeed(session_factory)
+  feed.last_id = 2
+  assert feed.settled([{"id": 5}], now=0.0) == []
+  assert [e["id"] for e in feed.settled([{"id": 5}], now=1.5)] == [5]
+  assert feed.skipped == {3: 1.5, 4: 1.5}
+
+  # 3 was only slow to commit; 4 rolled back and expires
+  assert feed.recover([{"id": 3, "user_id": 1}], now=2.0) == [{"id": 3, "user_id": 1, "late": True}]
+  assert feed.skipped == {4: 1.5}
+  feed.recover([], now=12.0)
+  assert feed.skipped == {} and feed.late == {3: 2.0}
+
+def test_stream_delivers_late_events_below_offset(db, session_factory):
+  for transaction_id in (1, 2, 3):
+      db.add(OutboxEvent(
+          user_id=1, event_type="transaction.created",
+          transaction_id=transaction_id, payload={"transaction_id": transaction_id}
+      ))
+  db.commit()
+  feed = ChangeFeed(session_factory)
+  feed.last_id = 3
+  feed.late = {2: 0.0}
+
+  async def scenario():
+      # The client saw 3, but 2 committed after the relay moved past it
+      stream = stream_changes(feed, user_id=1, after=3)
+      resent = await anext(stream)
+      feed.publish([{"id": 1, "user_id": 1, "event_type": "transaction.created", "payload": {}, "late": True}])
+      followed = await anext(stream)
+      await stream.aclose()
+      return resent, followed
+
+  resent, followed = asyncio.run(scenario())
+  assert resent.startswith("id: 0:2\n")
+  assert followed.startswith("id: 0:1\n")
+
+def test_changes_releases_session_before_streaming(db, session_factory):
+  session = session_factory()
+  closed = []
+  session.close = lambda: closed.append(True)
+  response = asyncio.run(get_changes(after="0", last_event_id=None, db=session, current_user=db.get(User, 1)))
+  assert isinstance(response, StreamingResponse)
+  assert closed
+
+def test_stream_resets_offsets_older_than_retention(db, session_factory):
+  for transaction_id in (1, 2, 3):
+      db.add(OutboxEvent(
+          user_id=1, event_type="transaction.created",
+          transaction_id=transaction_id, payload={"transaction_id": transaction_id}
+      ))
+  db.commit()
+  # Pruned by OUTBOX_RETENTION_HOURS
+  db.query(OutboxEvent).filter(OutboxEvent.id < 3).delete()
+  db.commit()
+  feed = ChangeFeed(session_factory)
+  feed.last_id = 3
+
+  async def scenario(after):
+      stream = stream_changes(feed, user_id=1, after=after)
+      first = await anext(stream)
+      await stream.aclose()
+      return first
+
+  assert asyncio.run(scenario(1)) == 'id: 0:3\nevent: reset\ndata: {"reason": "history_pruned"}\n\n'
+  # Nothing was lost past offset 2
+  assert asyncio.run(scenario(2)).startswith("id: 0:3\nevent: transaction.created\n")
+
+def test_offset_from_another_shard_is_reset(db, session_factory, monkeypatch):
+  # The user now lives on shard 0; the client's offset is from shard 1
+  monkeypatch.setattr(outbox, "change_feeds", [ChangeFeed(session_factory)])
+  monkeypatch.setattr(changes, "change_feeds", outbox.change_feeds)
+  outbox.change_feeds[0].last_id = 7
+
+  async def scenario():
+      response = await get_changes(after="0", last_event_id="1:40", db=session_factory(), current_user=db.get(User, 1))
+      first = await anext(response.body_iterator)
+      await response.body_iterator.aclose()
+      return first
+
+  assert asyncio.run(scenario()) == 'id: 0:7\nevent: reset\ndata: {"reason": "shard_moved"}\n\n'
+  assert outbox.parse_offset("12") == (None, 12)
+  with pytest.raises(ValueError):
+      outbox.parse_offset("a:b")
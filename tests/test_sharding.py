@@ -0,0 +1,190 @@
+# tests/test_sharding.py
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.main import app
+from app.core import sharding
+from app.core.auth import get_current_active_user
+from app.core.cache import user_key_builder
+from app.core.archive import archive_tree
+from app.core.sharding import ShardRouter, get_write_shard_db, move_user, pin_users, rebalance
+from app.database import Base, get_db
+from app.models.transaction import ArchivedTransaction, ArchivedTree, ShardAssignment, Transaction, User
+
+@pytest.fixture(scope="function")
+def router(tmp_path, monkeypatch):
+  # A throwaway primary for users and the directory; the TestClient runs the
+  # app in another thread, so it must be shareable across threads
+  primary_engine = create_engine(
+      f"sqlite:///{tmp_path}/primary.db",
+      connect_args={"check_same_thread": False},
+  )
+  Base.metadata.create_all(bind=primary_engine)
+  monkeypatch.setattr(sharding, "engine", primary_engine)
+  monkeypatch.setattr(sharding, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=primary_engine))
+  router = ShardRouter([f"sqlite:///{tmp_path}/shard{i}.db" for i in range(3)], directory_ttl=0)
+  router.create_all()
+  monkeypatch.setattr(sharding, "shard_router", router)
+  try:
+      yield router
+  finally:
+      router.dispose()
+      primary_engine.dispose()
+
+def primary_db():
+  db = sharding.SessionLocal()
+  try:
+      yield db
+  finally:
+      db.close()
+
+def add_user(user_id: int) -> User:
+  db = sharding.SessionLocal()
+  user = User(id=user_id, email=f"user{user_id}@example.com", hashed_password="x", is_active=True)
+  db.add(user)
+  db.commit()
+  db.refresh(user)
+  db.expunge(user)
+  db.close()
+  return user
+
+def count_rows(router, shard, user_id) -> int:
+  db = router.sessionmakers[shard]()
+  try:
+      return db.query(Transaction).filter(Transaction.user_id == user_id).count()
+  finally:
+      db.close()
+
+def test_ring_spreads_users_and_grows_consistently(router):
+  placements = {user_id: router.ring_shard(user_id) for user_id in range(1, 601)}
+  assert set(placements.values()) == {0, 1, 2}
+  assert all(router.ring_shard(user_id) == shard for user_id, shard in placements.items())
+
+  # Growing to four shards only moves users onto the new shard
+  moved = {user_id for user_id in placements if router.ring_shard(user_id, 4) != placements[user_id]}
+  assert all(router.ring_shard(user_id, 4) == 3 for user_id in moved)
+  assert 0.1 < len(moved) / len(placements) < 0.4
+
+def test_requests_use_the_users_shard(router):
+  user = add_user(7)
+  FastAPICache.reset()
+  FastAPICache.init(InMemoryBackend(), prefix="test", key_builder=user_key_builder)
+  app.dependency_overrides[get_db] = primary_db
+  app.dependency_overrides[get_current_active_user] = lambda: user
+  try:
+      client = TestClient(app)
+      client.put("/transactionservice/transaction/1", json={"amount": 5, "type": "cars"})
+      client.put("/transactionservice/transaction/2", json={"amount": 7, "type": "cars", "parent_id": 1})
+      assert client.get("/transactionservice/sum/1").json() == {"sum": 12}
+  finally:
+      app.dependency_overrides.clear()
+      FastAPICache.reset()
+
+  home = router.ring_shard(7)
+  assert [count_rows(router, shard, 7) for shard in range(3)] == [2 if shard == home else 0 for shard in range(3)]
+
+def test_move_user_copies_tree_and_switches_directory(router):
+  user = add_user(7)
+  source = router.ring_shard(7)
+  target = (source + 1) % 3
+  db = router.sessionmakers[source]()
+  router.ensure_user(source, db, user)
+  db.add_all([
+      Transaction(transaction_id=3, amount=1, type="a", parent_id=None, user_id=7),
+      Transaction(transaction_id=1, amount=1, type="a", parent_id=3, user_id=7),
+      Transaction(transaction_id=2, amount=1, type="a", parent_id=1, user_id=7),
+  ])
+  db.commit()
+  db.close()
+
+  assert move_user(7, target, router) == 3
+  assert count_rows(router, source, 7) == 0
+  assert count_rows(router, target, 7) == 3
+  primary = sharding.SessionLocal()
+  try:
+      assert router.shard_for(7, primary) == target
+  finally:
+      primary.close()
+
+def test_move_user_carries_archived_trees(router):
+  user = add_user(7)
+  source = router.ring_shard(7)
+  target = (source + 1) % 3
+  db = router.sessionmakers[source]()
+  router.ensure_user(source, db, user)
+  db.add_all([
+      Transaction(transaction_id=1, amount=1, type="a", parent_id=None, user_id=7),
+      Transaction(transaction_id=2, amount=1, type="a", parent_id=1, user_id=7),
+  ])
+  db.commit()
+  archive_tree(db, 1, 7)
+  db.commit()
+  db.close()
+
+  assert move_user(7, target, router) == 1
+  for shard, trees in ((source, 0), (target, 1)):
+      db = router.sessionmakers[shard]()
+      try:
+          assert db.query(ArchivedTree).count() == trees
+          assert db.query(ArchivedTransaction).count() == trees
+      finally:
+          db.close()
+
+def test_pin_then_rebalance(router):
+  add_user(11)
+  assert pin_users(old_shard_count=1, router=router) == 1
+  primary = sharding.SessionLocal()
+  try:
+      assert primary.get(ShardAssignment, 11).shard == 0
+  finally:
+      primary.close()
+
+  expected = router.ring_shard(11)
+  assert rebalance(router) == (0 if expected == 0 else 1)
+  primary = sharding.SessionLocal()
+  try:
+      assert router.shard_for(11, primary) == expected
+  finally:
+      primary.close()
+
+def test_transaction_ids_are_unique_across_shards(router):
+  first = add_user(7)
+  second = next(user_id for user_id in range(8, 100) if router.ring_shard(user_id) != router.ring_shard(7))
+  second = add_user(second)
+  FastAPICache.reset()
+  FastAPICache.init(InMemoryBackend(), prefix="test", key_builder=user_key_builder)
+  app.dependency_overrides[get_db] = primary_db
+  try:
+      client = TestClient(app)
+      app.dependency_overrides[get_current_active_user] = lambda: first
+      assert client.put("/transactionservice/transaction/1", json={"amount": 5, "type": "cars"}).status_code == 200
+      app.dependency_overrides[get_current_active_user] = lambda: second
+      response = client.put("/transactionservice/transaction/1", json={"amount": 7, "type": "cars"})
+      assert response.status_code == 400
+  finally:
+      app.dependency_overrides.clear()
+      FastAPICache.reset()
+
+  assert count_rows(router, router.ring_shard(second.id), second.id) == 0
+  # The id can follow its owner to the other user's shard
+  assert move_user(7, router.ring_shard(second.id), router) == 1
+
+def test_write_that_resolved_before_move_is_refused(router):
+  user = add_user(7)
+  router.directory_ttl = 60
+  primary = sharding.SessionLocal()
+  try:
+      # Cached as active, then marked moving by another worker
+      router.shard_for(7, primary)
+      primary.add(ShardAssignment(user_id=7, shard=router.ring_shard(7), status="moving"))
+      primary.commit()
+      with pytest.raises(HTTPException) as refused:
+          next(get_write_shard_db(user, primary))
+      assert refused.value.status_code == 503
+  finally:
+      primary.close()
@@ -0,0 +1,80 @@
+# tests/test_startup.py
+import time
+import pytest
+from fastapi.testclient import TestClient
+from fastapi_cache import FastAPICache
+
+from app import main, server
+from app.main import app
+from app.core import startup
+from app.core.sharding import shard_router
+from app.models.transaction import Transaction
+
+@pytest.fixture(scope="function")
+def lifespan(db, memory_engine_router, monkeypatch):
+  """The app with its startup hooks, minus Redis, log files and the outbox relay"""
+  async def noop():
+      pass
+
+  async def cache_up():
+      return True
+
+  monkeypatch.setattr(main, "setup_logging", lambda: None)
+  monkeypatch.setattr(main, "setup_cache", noop)
+  monkeypatch.setattr(main, "cache_available", cache_up)
+  monkeypatch.setattr(main, "change_feeds", [])
+  monkeypatch.setattr(startup.settings, "CACHE_WARMUP_USERS", 1)
+  monkeypatch.setitem(startup.state, "ready", False)
+  monkeypatch.setattr(startup, "timings", {"import_s": startup.timings["import_s"]})
+  FastAPICache.get_backend()._store.clear()
+  return db
+
+@pytest.fixture(scope="function")
+def memory_engine_router(session_factory, monkeypatch):
+  # Pool warm-up and the hot path queries go through the shard router
+  monkeypatch.setattr(shard_router, "engines", [session_factory.kw["bind"]])
+  monkeypatch.setattr(shard_router, "sessionmakers", [session_factory])
+  # Shutdown would close the shared in-memory database under the db fixture
+  monkeypatch.setattr(shard_router, "dispose", lambda: None)
+
+def wait_for_warmup(timeout: float = 5.0) -> None:
+  deadline = time.monotonic() + timeout
+  while "warmup_s" not in startup.timings:
+      assert time.monotonic() < deadline, "cache warm-up did not finish"
+      time.sleep(0.01)
+
+def test_warmup_fills_sum_and_type_keys(lifespan):
+  db = lifespan
+  db.add_all([
+      Transaction(transaction_id=1, amount=5, type="cars", user_id=1),
+      Transaction(transaction_id=2, amount=7, type="food", parent_id=1, user_id=1),
+  ])
+  db.commit()
+
+  with TestClient(app):
+      wait_for_warmup()
+
+  keys = list(FastAPICache.get_backend()._store)
+  assert sum(":get_transaction_sum:" in key for key in keys) == 1
+  assert sum(":get_transactions_by_type:" in key for key in keys) == 2
+
+def test_ready_waits_for_startup_and_reports_timings(lifespan):
+  response = TestClient(app).get("/ready")
+  assert response.status_code == 503
+
+  with TestClient(app) as client:
+      response = client.get("/ready")
+      assert response.status_code == 200
+      assert {"import_s", "ready_s"} <= set(response.json()["startup"])
+      wait_for_warmup()
+
+@pytest.mark.parametrize("present, loop, http", [(True, "uvloop", "httptools"), (False, "asyncio", "h11")])
+def test_server_picks_fast_loop_and_parser_when_installed(monkeypatch, present, loop, http):
+  runs = []
+  monkeypatch.setattr(server, "_available", lambda module: present)
+  monkeypatch.setattr(server.uvicorn, "run", lambda app, **options: runs.append((app, options)))
+  server.main()
+  [(target, options)] = runs
+  assert target == "app.main:app"
+  assert (options["loop"], options["http"]) == (loop, http)
+  assert options["timeout_graceful_shutdown"] == server.settings.GRACEFUL_SHUTDOWN_SECONDS
@@ -0,0 +1,61 @@
+# tests/test_tracing.py
+import pytest
+from app.core import tracing
+from app.core.tracing import Span, span
+
+@pytest.fixture(scope="function")
+def client(api, monkeypatch, tmp_path):
+  buffer = tracing.trace_buffer
+  buffer.traces.clear()
+  monkeypatch.setattr(buffer, "export_path", str(tmp_path / "traces.jsonl"))
+  monkeypatch.setattr(tracing.settings, "TRACE_SAMPLE_RATE", 1.0)
+  return api, buffer
+
+def names(trace: dict) -> list[str]:
+  found = [trace["name"]]
+  for child in trace["children"]:
+      found += names(child)
+  return found
+
+def find(trace: dict, name: str) -> dict:
+  if trace["name"] == name:
+      return trace
+  for child in trace["children"]:
+      match = find(child, name)
+      if match:
+          return match
+  return None
+
+def test_span_is_noop_outside_a_trace():
+  with span("orphan") as orphan:
+      orphan.set(rows=1)
+
+def test_spans_nest_under_the_request(client):
+  client, buffer = client
+  client.put("/transactionservice/transaction/1", json={"amount": 5, "type": "cars"})
+  client.put("/transactionservice/transaction/2", json={"amount": 7, "type": "cars", "parent_id": 1})
+  client.get("/transactionservice/sum/1")
+
+  create, _, read = list(buffer.traces)
+  chain = find(create, "db.parent_chain")
+  assert chain is not None
+  assert find(read, "cache.get")["attributes"]["status"] == "MISS"
+  subtree = find(read, "db.subtree_sum")
+  assert subtree["attributes"]["rows"] == 2
+  assert [child["name"] for child in subtree["children"]] == ["db.query"]
+  assert read["attributes"]["status_code"] == 200
+  assert read["attributes"]["route"].endswith("/sum/{transaction_id}")
+
+  with open(buffer.export_path) as exported:
+      assert len(exported.read().splitlines()) == 3
+
+def test_slowest_traces_endpoint(client, monkeypatch):
+  client, buffer = client
+  assert client.get("/debug/traces").status_code == 404
+  monkeypatch.setattr(tracing.settings, "TRACE_ENDPOINT_ENABLED", True)
+  slow = Span("GET /slow")
+  slow.end = slow.start + 2
+  buffer.record(slow)
+  response = client.get("/debug/traces", params={"limit": 1})
+  assert response.status_code == 200
+  assert response.json()["traces"][0]["name"] == "GET /slow"